@@ -1,30 +1,123 @@
 
 import   logging
+import   os
 logger = logging.getLogger(__name__)
-from     utils.import_package_modules import import_package_modules
-from     langchain.agents.load_tools  import load_tools
-import   langchain_community.utilities    as lcutils
-import   langchain_community.tools        as lctools  
-import   crewai_tools
-import   tools 
 
 class AppConfig:
     version = "0.5.3"
     name= "crewai-sheets-ui"
     template_sheet_url = "https://docs.google.com/spreadsheets/d/1J975Flh82qPjiyUmDE_oKQ2l4iycUq6B3457G5kCD18/copy"
+    cache_dir = os.environ.get("CREWAI_SHEETS_CACHE_DIR",               # Local caches (tool index, ...) live here
+                               os.path.join(os.path.expanduser("~"), ".cache", "crewai-sheets-ui"))
     pass
 
 class ToolsConfig:
-    # DEFINE MODULES FROM WHICH TO IMPORT TOOLS
-    # [package, "alias",]
-    modules_list        = [(tools, "tools"),]
-    callables_list      = [load_tools,]                                 # Define specific callables to register e.g. in case they are not callable without specific parameters  
-    integration_dict    = {}                                            # Dictionary to which public module members are added   
-    import_package_modules(crewai_tools, modules_list, integration_dict)                  # Add to modules listAdd all tool modules from crewai_tools
-    import_package_modules(lctools,      modules_list, integration_dict, recursive = True) 
-    import_package_modules(lcutils,      modules_list, integration_dict, recursive = True)    # Add to modules list all tool modules from langchain_community.tools 
+    # DEFINE PACKAGES FROM WHICH TO IMPORT TOOLS
+    # Packages are only indexed at startup. A module is imported when the Tools sheet references one of its callables.
+    packages_list       = ["tools",                                     # crewai-sheets-ui tools
+                           "crewai_tools",
+                           "langchain_community.tools",
+                           "langchain_community.utilities",]
+    modules_list        = []                                            # [(module, "alias"),] modules to register eagerly
+    callables_list      = ["langchain.agents.load_tools:load_tools",]  # Define specific callables to register e.g. in case they are not callable without specific parameters  
+    index_cache_path    = os.path.join(AppConfig.cache_dir, "callable_index.json")   # None disables the on-disk index
+    # How agents receive a tool built from the Tools sheet, keyed by sheet 'Tool' name or class/function name:
+    #   'shared' - default, one instance built per run and handed to every agent
+    #   'clone'  - one instance built per run, agents get a shallow copy (own fields, shared heavy clients)
+    #   'new'    - a fresh instance is built for every agent that uses the tool
+    tool_instancing     = {}
     pass                                                                
 
+class SheetsConfig:
+    fetch_timeout       = 30                                            # Seconds allowed for downloading one worksheet
+    fetch_workers       = 5                                             # Worksheets downloaded concurrently
+    cache_enabled       = True                                          # Keep local snapshots of downloaded worksheets
+    cache_dir           = os.path.join(AppConfig.cache_dir, "sheets")
+    cache_ttl           = 0                                             # Seconds a snapshot is used without revalidating it
+    offline             = False                                         # Only use local snapshots, never download
+
+class AgentsConfig:
+    build_workers       = 8                                             # Agents created concurrently, 1 builds them one by one
+
+class ServerConfig:
+    host                = "127.0.0.1"                                   # Only local clients by default
+    port                = 8765
+    reload_interval     = 30                                            # Seconds between checks of the sheet for changes
+
+class SchedulerConfig:
+    workers             = 4                                             # Crews run concurrently by the server
+    max_queued          = 16                                            # Jobs waiting for a worker before new ones are refused
+    executor            = "thread"                                      # "thread" or "process" (one sheet load per worker process)
+    keep_finished       = 1000                                          # Finished jobs kept for status queries
+
+class TaskGraphConfig:
+    workers             = 4                                             # Independent tasks run concurrently (sequential crews with 'Depends on')
+
+class InstrumentationConfig:
+    enabled             = False                                         # Record spans of sheet loading, tools, tasks, LLM and tool calls
+    trace_dir           = os.path.join(AppConfig.cache_dir, "traces")   # JSON traces are written here unless a path is given
+    max_spans           = 100000                                        # Finished spans kept in memory, oldest are dropped
+    summary_rows        = 30                                            # Rows of the summary table printed at exit
+
+class TracingConfig:
+    # Span exporters, comma separated in CREWAI_SHEETS_TRACING or --tracing:
+    #   'file' - one JSON line per finished span appended to file_path
+    #   'otlp' - OTLP/HTTP JSON to an OpenTelemetry collector at otlp_endpoint
+    backends            = [name.strip() for name in os.environ.get("CREWAI_SHEETS_TRACING", "").split(",") if name.strip()]
+    sample_rate         = float(os.environ.get("CREWAI_SHEETS_TRACE_SAMPLE_RATE", 1.0))   # Fraction of traces recorded
+    service_name        = AppConfig.name
+    file_path           = os.path.join(AppConfig.cache_dir, "traces", "spans.jsonl")
+    otlp_endpoint       = os.environ.get("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "http://localhost:4318/v1/traces")
+    otlp_headers        = {}                                            # e.g. {"Authorization": "Bearer ..."}
+    otlp_batch_size     = 256                                           # Spans per request
+    otlp_flush_interval = 5                                             # Seconds between exports of pending spans
+    otlp_queue_size     = 10000                                         # Pending spans kept, newer ones are dropped beyond that
+    otlp_timeout        = 10
+
+class SentryConfig:
+    enabled             = os.environ.get("CREWAI_SHEETS_SENRY") != "False"   # Error reports to the project's Sentry
+    dsn                 = os.environ.get("CREWAI_SHEETS_SENTRY_DSN",
+                                         "https://fc662aa323fcc1629fb9ea7713f63137@o4507186870157312.ingest.de.sentry.io/4507186878414928")
+    traces_sample_rate  = float(os.environ.get("CREWAI_SHEETS_SENTRY_TRACES_SAMPLE_RATE", 0.0))     # Performance traces, 0 is off
+    profiles_sample_rate = float(os.environ.get("CREWAI_SHEETS_SENTRY_PROFILES_SAMPLE_RATE", 0.0)) # Share of traced runs profiled
+
+class BatchConfig:
+    workers             = 4                                             # Crews run concurrently in batch mode
+
+class CheckpointConfig:
+    enabled             = True                                          # Save each task's output when it completes
+    directory           = os.path.join(AppConfig.cache_dir, "checkpoints")
+    keep_completed      = False                                         # Keep a run's checkpoints after it succeeded
+
+class LLMConfig:
+    pool_clients        = True                                          # Share one client per identical model configuration
+
+class LLMGuardConfig:
+    # Request limits per model come from the optional Models sheet columns 'RPM', 'TPM', 'Max in-flight' and 'Max retries'
+    enabled             = True                                          # Wrap every LLM with rate limits and retries
+    max_retries         = 3                                             # Retries on 429 and 5xx when the sheet sets none
+    backoff_base        = 1.0                                           # Seconds before the first retry, doubled per retry
+    backoff_max         = 60.0                                          # Longest wait between retries
+
+class LLMCacheConfig:
+    enabled             = False                                         # Opt in with --llm_cache
+    path                = os.path.join(AppConfig.cache_dir, "llm_cache.sqlite")
+    ttl                 = 7 * 24 * 3600                                 # Seconds a response is reused, 0 keeps them forever
+    max_entries         = 10000                                         # Responses kept on disk, least recently used go first
+    memory_entries      = 256                                           # Responses also kept in memory
+    allow_nonzero_temperature = False                                   # Also cache sampled (temperature > 0) calls
+
+class RateLimitConfig:
+    # SQLite file holding rate-limit budgets shared by all crew processes on this host. None keeps them per process.
+    shared_state_path   = os.environ.get("CREWAI_SHEETS_RATE_LIMIT_DB")
+    default_shared_state_path = os.path.join(AppConfig.cache_dir, "rate_limits.sqlite")
+
+class TokenizerConfig:
+    default_encoding    = "cl100k_base"                                 # For models tiktoken doesn't know, e.g. Groq's
+    cache_dir           = os.environ.get("TIKTOKEN_CACHE_DIR", os.path.join(AppConfig.cache_dir, "tiktoken"))
+    bpe_files           = {}                                            # {encoding name: local .tiktoken file} for air-gapped hosts
+    token_count_cache_size = 4096                                       # Message token counts kept per process
+
 class OllamaConfig:
     #patch_stop_words = True
     #patch_num_ctx = True
@@ -1,12 +1,16 @@
 from .sheets_loader          import Sheets
+from .sheet_sources          import get_sheet_source
 from .import_package_modules import import_package_modules
+from .import_package_modules import index_package_modules
 from .safe_argment_parser    import parse_arguments
 from .callable_registry      import CallableRegistry
 from .helpers                import load_env
 from .helpers                import get_sheet_url_from_user
 from .tools_mapping          import ToolsMapping
 from .tools_llm_config       import ConfigurationManager
+from .model_registry         import ModelRegistry, ModelRecord
 from .cli_parser             import get_parser
 from .agent_crew_llm         import get_llm
+from .crew_builder           import CrewBuilder
 from .ollama_loader          import OllamaLoader
 from .groq                   import TokenThrottledChatGroq
\ No newline at end of file
@@ -10,12 +10,63 @@ from langchain_openai import ChatOpenAI, AzureOpenAI, AzureChatOpenAI
 #from langchain_groq import ChatGroq
 from utils.groq import TokenThrottledChatGroq
 from utils.helpers import load_env
+from utils.llm_guard import guard_llm
+from utils.instrumentation import tracer
 from ollama  import pull, list
 import os
+import threading
 from tqdm import tqdm
 
+# LLM client pool: (provider, model, base_url, deployment, temperature, num_ctx, limits) -> LLM instance
+_llm_pool = {}
+_llm_pool_locks = {}
+_llm_pool_lock = threading.Lock()
+
 def get_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None, base_url = None, 
-            deployment=None,  **kwargs):
+            deployment=None, rpm=None, tpm=None, max_in_flight=None, max_retries=None, **kwargs):
+    """
+    Retrieves an LLM from the client pool, creating it with create_llm() on first use.
+    Identical configurations share one underlying client and its keep-alive connections: each caller
+    gets a shallow copy of the pooled instance, so per-agent state such as callbacks stays separate.
+    Pooling can be turned off with config.LLMConfig.pool_clients. Parameters are those of create_llm(), plus
+    the request limits of the model (rpm, tpm, max_in_flight, max_retries), see utils.llm_guard.
+    """
+    limits = {'rpm': rpm, 'tpm': tpm, 'max_in_flight': max_in_flight, 'max_retries': max_retries}
+    if config.LLMGuardConfig.enabled:
+        kwargs.setdefault('client_retries', 0)                          # The guard retries, the SDK client must not retry too
+    with tracer.span(f"get_llm {provider}/{model_name}", kind='setup', provider=provider, model=model_name) as span:
+        if not config.LLMConfig.pool_clients:
+            llm = create_llm(model_name, temperature, num_ctx, provider, base_url, deployment, **kwargs)
+            return guard_llm(llm, provider, model_name, **limits)
+
+        key = (str(provider).lower(), model_name, base_url, deployment, temperature, num_ctx, rpm, tpm, max_in_flight, max_retries)
+        with _llm_pool_lock:
+            key_lock = _llm_pool_locks.setdefault(key, threading.Lock())
+        with key_lock:                                                  # Build each configuration only once
+            llm = _llm_pool.get(key)
+            if llm is None:
+                llm = create_llm(model_name, temperature, num_ctx, provider, base_url, deployment, **kwargs)
+                if llm is None:
+                    return None                                         # Don't pool failures, retry next time
+                llm = guard_llm(llm, provider, model_name, **limits)    # Rate limits and retries, shared by the copies
+                _llm_pool[key] = llm
+            else:
+                logger.info(f"Reusing pooled {provider} client for model '{model_name}'.")
+                if span is not None:
+                    span.set(pooled=True)
+        try:
+            return llm.copy()                                           # pydantic shallow copy, shares the client
+        except Exception:
+            return llm
+
+def clear_llm_pool():
+    """Drop all pooled LLM clients, e.g. after the Models sheet changed."""
+    with _llm_pool_lock:
+        _llm_pool.clear()
+        _llm_pool_locks.clear()
+
+def create_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None, base_url = None, 
+            deployment=None, client_retries=None, **kwargs):
     """
     Retrieves an appropriate LLM based on specified parameters, including provider and model specifics.
     The function checks if the specific model or a base model already exists in Ollama and does not pull
@@ -30,6 +81,7 @@ def get_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None,
     - deployment (str): Deployment specifics, primarily used for Azure.
     - progress (object): Progress tracking object, usually a UI element to indicate progress to the user.
     - llm_task (object): Task identifier for updating progress status.
+    - client_retries (int): max_retries of the provider's SDK client, its own default if None.
     #TODO: - **kwargs: Additional keyword arguments that may be required by specific providers. Pass 
 
     Returns:
@@ -43,6 +95,7 @@ def get_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None,
     """
 
     #load_env("../../ENV/.env", ["OPENAI_API_KEY","OPENAI_BASE_URL"])
+    retries = {} if client_retries is None else {'max_retries': client_retries}
 
     #Anthropic. 
     if provider.lower() == "anthropic":
@@ -52,6 +105,7 @@ def get_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None,
                 model_name  = model_name,                            #use model_name as endpoint
                 api_key     = os.environ.get("ANTHROPIC_API_KEY"),
                 temperature = temperature,
+                **retries,
                 #stop = ["\nObservation"] 
             )
         except Exception as e:
@@ -68,7 +122,8 @@ def get_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None,
                 azure_endpoint   = base_url,                           
                 api_key          = os.environ.get("AZURE_OPENAI_KEY"),
                 api_version=os.environ.get("AZURE_OPENAI_VERSION"),
-                temperature=temperature
+                temperature=temperature,
+                **retries,
                 )
         except Exception as e:
             print(f"Hey, I've failed to configure Azure OpenAI model '{model_name}'. Could you check if the API KEY is set? :\n{e}")
@@ -86,6 +141,7 @@ def get_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None,
                 model           = model_name, 
                 temperature     = temperature,
                 base_url        = base_url,
+                **retries,
                 )
         except Exception as e:
             print(f"Hey, I've failed to configure OpenAI model '{model_name}'. Could you check if the API KEY is set? :\n{e}")
@@ -99,7 +155,8 @@ def get_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None,
                 model           = model_name, 
                 temperature     = temperature,
                 base_url        = base_url,
-                openai_api_key  = 'NA' #TODO suppoert for local llm API key's
+                openai_api_key  = 'NA', #TODO suppoert for local llm API key's
+                **retries,
                 )
         except Exception as e:
             print(f"Hey, I've failed to configure OpenAI model '{model_name}'. Could you check if the API KEY is set? :\n{e}")
@@ -116,7 +173,7 @@ def get_llm(model_name= None, temperature=0.7, num_ctx = None, provider  = None,
                 model            = model_name, 
                 temperature      = temperature,
                 max_tokens       = max_tokens,
-                
+                **retries,
                 #base_url        = base_url,
                 )
         except Exception as e:
@@ -0,0 +1,76 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import BatchConfig
+from     concurrent.futures import ThreadPoolExecutor, as_completed
+from     utils.instrumentation import tracer
+import   pandas as pd
+import   json
+import   os
+import   threading
+import   time
+
+
+def read_assignments(path):
+    """
+    Read assignments from a CSV file (an 'Assignment' column, else the first column; optional 'id' column)
+    or a JSONL file (one string or {"id": ..., "assignment": ...} object per line).
+    Returns a list of (id, assignment). Rows without an id are numbered from 1.
+    """
+    assignments = []
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(path, 'r', encoding='utf-8') as jsonl_file:
+            for number, line in enumerate(jsonl_file, start=1):
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if isinstance(item, dict):
+                    assignments.append((item.get('id', number), item.get('assignment', item.get('Assignment'))))
+                else:
+                    assignments.append((number, item))
+    else:
+        df = pd.read_csv(path)
+        column = 'Assignment' if 'Assignment' in df.columns else df.columns[0]
+        ids = df['id'] if 'id' in df.columns else range(1, len(df) + 1)
+        assignments = [(id_, text) for id_, text in zip(ids, df[column])]
+    assignments = [(id_ if not hasattr(id_, 'item') else id_.item(), str(text))   # numpy ids -> plain JSON values
+                   for id_, text in assignments if text is not None and not pd.isna(text)]
+    logger.info(f"Read {len(assignments)} assignments from {path}.")
+    return assignments
+
+
+def run_batch(builder, assignments, output_path, workers=None, resume=False):
+    """
+    Run one crew per assignment on a pool of workers threads. Every result is appended to output_path
+    as one JSON line as soon as its crew finishes: {"id", "assignment", "status", "result" or "error", "seconds"}.
+    Returns (number succeeded, number failed).
+    """
+    workers = max(1, min(workers or BatchConfig.workers, len(assignments) or 1))
+    write_lock = threading.Lock()
+    succeeded = failed = 0
+
+    def run_one(id_, assignment):
+        started = time.monotonic()
+        try:
+            with tracer.span("batch assignment", kind='run', id=id_):         # One trace per assignment
+                result = builder.run(assignment, resume=resume, run_id=id_)     # Own checkpoints per row
+            return {'id': id_, 'assignment': assignment, 'status': 'ok', 'result': str(result),
+                    'seconds': round(time.monotonic() - started, 2)}
+        except Exception as e:
+            logger.error(f"Crew for assignment {id_} failed: {e}")
+            return {'id': id_, 'assignment': assignment, 'status': 'error', 'error': str(e),
+                    'seconds': round(time.monotonic() - started, 2)}
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'a', encoding='utf-8') as output_file, \
+         ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as executor:
+        futures = [executor.submit(run_one, id_, assignment) for id_, assignment in assignments]
+        for future in as_completed(futures):
+            record = future.result()
+            with write_lock:
+                output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output_file.flush()
+            if record['status'] == 'ok':
+                succeeded += 1
+            else:
+                failed += 1
+    return succeeded, failed
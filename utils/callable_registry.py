@@ -2,12 +2,29 @@
 import   logging
 logger = logging.getLogger(__name__)
 from     config.config import ToolsConfig
+from     utils.import_package_modules import index_package_modules
+from     importlib import metadata
+import   importlib
+import   importlib.util
 import   inspect
+import   json
+import   os
+import   sys
 
-callables_list = ToolsConfig.callables_list
-modules_list   = ToolsConfig.modules_list
+callables_list   = ToolsConfig.callables_list
+modules_list     = ToolsConfig.modules_list
+packages_list    = ToolsConfig.packages_list
+index_cache_path = ToolsConfig.index_cache_path
+INDEX_CACHE_FORMAT = 2                                                  # Bump when the index layout changes
 
 class CallableRegistry:
+    """
+    Registry of callables that can be used as tools in the Tools sheet.
+    Packages in ToolsConfig.packages_list are only indexed (name -> 'module:attribute') at startup.
+    A module is imported the first time one of its callables is requested.
+    The index is persisted to ToolsConfig.index_cache_path and reused while the installed package
+    versions (or, for local packages, file modification times) stay the same.
+    """
     _instance = None                                                    # Singleton
 
     def __new__(cls):
@@ -16,29 +33,130 @@ class CallableRegistry:
             cls._instance = super(CallableRegistry, cls).__new__(cls)
             cls._instance.callable_dict = {}
             cls._instance.simple_name_dict = {}
+            cls._instance.index = {}                                    # simple or qualified name -> ['module:attribute', ...]
+            if not cls._instance.load_index_cache(index_cache_path):
+                cls._instance.build_index(packages_list)
+                cls._instance.save_index_cache(index_cache_path)
             cls._instance.register_modules(modules_list)
             cls._instance.register_callables(callables_list)
         return cls._instance
 
+    def build_index(self, packages_list):
+        """Indexes all public classes and functions of the given packages without importing them."""
+        definitions, reexports = {}, {}
+        for package_name in packages_list:
+            index_package_modules(package_name, definitions, reexports, recursive=True)
+
+        def canonical(target):
+            seen = set()
+            while target in reexports and target not in seen:          # Follow re-exports back to the defining module
+                seen.add(target)
+                target = reexports[target]
+            return target
+
+        for name, targets in definitions.items():
+            for target in targets:
+                self._add_to_index(name, target)
+                self._add_to_index(target.replace(':', '.'), target)
+        for alias, target in reexports.items():
+            target = canonical(target)
+            self._add_to_index(alias.replace(':', '.'), target)
+            simple_name = alias.split(':')[1]
+            if simple_name not in definitions:                          # Prefer definitions over re-exported third party names
+                self._add_to_index(simple_name, target)
+        logger.info(f"Indexed {len(self.index)} callable names from {len(packages_list)} packages.")
+
+    @staticmethod
+    def index_cache_key(packages_list):
+        """Fingerprint of everything the index depends on: package versions, local package mtimes, configuration."""
+        fingerprints = {}
+        for package_name in packages_list:
+            top_level = package_name.split('.')[0]
+            if top_level in fingerprints:
+                continue
+            for dist_name in (top_level.replace('_', '-'), top_level):
+                try:
+                    fingerprints[top_level] = metadata.version(dist_name)
+                    break
+                except metadata.PackageNotFoundError:
+                    continue
+            else:                                                       # Local package, e.g. ./tools: use the newest mtime
+                try:
+                    spec = importlib.util.find_spec(top_level)
+                except (ImportError, ValueError):
+                    spec = None
+                mtime = 0
+                for path in (spec.submodule_search_locations or []) if spec else []:
+                    for root, _, files in os.walk(path):
+                        mtime = max([mtime, os.path.getmtime(root)] + 
+                                    [os.path.getmtime(os.path.join(root, f)) for f in files if f.endswith('.py')])
+                fingerprints[top_level] = f"mtime:{mtime}"
+        return {
+            'format':         INDEX_CACHE_FORMAT,
+            'python':         sys.version.split()[0],
+            'packages':       list(packages_list),
+            'callables':      [c for c in callables_list if isinstance(c, str)],
+            'fingerprints':   fingerprints,
+        }
+
+    def load_index_cache(self, path):
+        """Loads the index from the cache file. Returns False if there is no valid cache for the current environment."""
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, 'r') as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read tool index cache '{path}': {e}")
+            return False
+        if cached.get('key') != self.index_cache_key(packages_list):
+            logger.info("Tool index cache is stale. Rebuilding.")
+            return False
+        self.index = cached['index']
+        logger.info(f"Loaded {len(self.index)} callable names from tool index cache '{path}'.")
+        return True
+
+    def save_index_cache(self, path):
+        """Persists the index. Written to a temporary file first so concurrent runs never read a partial file."""
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as cache_file:
+                json.dump({'key': self.index_cache_key(packages_list), 'index': self.index}, cache_file)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write tool index cache '{path}': {e}")
+
+    def _add_to_index(self, name, target):
+        targets = self.index.setdefault(name, [])
+        if target not in targets:
+            targets.append(target)
+
     def register_modules(self, modules_list):
         """Registers all methods, functions, and classes from specified modules."""
         for module, alias in modules_list:
-            
+
             for name, obj in inspect.getmembers(module, predicate=lambda x: callable(x) or inspect.isclass(x)):
                 qualified_name = f"{alias}.{name}"
                 self._register_callable(name, qualified_name, obj)
                 logger.info(f"Registered {qualified_name} as callable.")
 
     def register_callables(self, callables_list):                           #e.gg loat_tools is not callable without parameters
-        """Registers specific callables provided in a list."""
+        """Registers specific callables provided in a list. 'module:attribute' strings are registered lazily."""
         for callable_item in callables_list:
             try:
-                if callable(callable_item):
+                if isinstance(callable_item, str):
+                    module_name, callable_name = callable_item.split(':')
+                    self._add_to_index(callable_name, callable_item)
+                    self._add_to_index(f"{module_name}.{callable_name}", callable_item)
+                elif callable(callable_item):
                     callable_name = getattr(callable_item, '__name__', type(callable_item).__name__)
                     callable_module = getattr(callable_item, '__module__', 'unknown_module')
                     qualified_name = f"{callable_module}.{callable_name}"
                     self._register_callable(callable_name, qualified_name, callable_item)
-            except AttributeError as e:
+            except (AttributeError, ValueError) as e:
                 logging.error(f"Failed to register {callable_item}: {str(e)}")
 
     def _register_callable(self, name, qualified_name, callable_item):
@@ -54,8 +172,32 @@ class CallableRegistry:
             self.simple_name_dict[name] = callable_item
         logger.info(f"Successfully registered callable: {qualified_name} as '{name}'.")
 
+    def _load_indexed(self, name):
+        """Imports the modules providing an indexed name and registers the callables found there."""
+        loaded = []
+        for target in self.index.pop(name, []):
+            module_name, attribute = target.split(':')
+            qualified_name = f"{module_name}.{attribute}"
+            if qualified_name in self.callable_dict:
+                loaded.append(self.callable_dict[qualified_name])
+                continue
+            try:
+                module = importlib.import_module(module_name)
+                logger.info(f"Imported module: {module_name}")
+                obj = getattr(module, attribute)
+            except (ImportError, AttributeError) as e:
+                logger.warning(f"Failed to import {target}: {e}")
+                continue
+            if callable(obj) or inspect.isclass(obj):
+                self._register_callable(attribute, qualified_name, obj)
+                loaded.append(obj)
+        if loaded and name not in self.callable_dict and name not in self.simple_name_dict:
+            self.callable_dict[name] = loaded[0]                        # Qualified alias, e.g. 'tools.FolderTool'
+
     def get_callable(self, name):
         """Retrieves a callable by its full name or simple name."""
+        if name in self.index:
+            self._load_indexed(name)
         if name in self.callable_dict:
             return self.callable_dict[name]
         elif name in self.simple_name_dict:
@@ -64,4 +206,25 @@ class CallableRegistry:
                 logging.warning(f"Multiple callables found for '{name}'. Returning the first one.")
                 return result[0]  # Return the first callable from the list
             return result
+        return self._import_fallback(name)
+
+    def _import_fallback(self, name):
+        """
+        Imports a name the index doesn't know, e.g. one created by a package's module __getattr__ or defined
+        in a compiled extension: 'module.attribute' from its module, a simple name from each package of
+        ToolsConfig.packages_list.
+        """
+        if '.' in name:
+            candidates = [tuple(name.rsplit('.', 1))]
+        else:
+            candidates = [(package_name, name) for package_name in packages_list]
+        for module_name, attribute in candidates:
+            try:
+                obj = getattr(importlib.import_module(module_name), attribute)
+            except (ImportError, AttributeError):
+                continue
+            if callable(obj) or inspect.isclass(obj):
+                logger.info(f"Found '{name}' in {module_name} by importing it.")
+                self._register_callable(attribute, f"{module_name}.{attribute}", obj)
+                return obj
         return None
@@ -0,0 +1,126 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import CheckpointConfig
+import   pandas as pd
+import   hashlib
+import   json
+import   os
+import   shutil
+import   time
+
+
+def snapshot_hash(*dataframes):
+    """Content hash of the sanitized worksheets. Any edit to the sheet gives a new hash."""
+    digest = hashlib.sha256()
+    for df in dataframes:
+        digest.update(",".join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df.astype(str), index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def run_key(sheet_hash, assignment, run_id=None):
+    """
+    Checkpoints belong to one sheet snapshot and one assignment, and to one run_id if given
+    (e.g. a batch row, so rows with the same assignment don't share checkpoints).
+    """
+    text = f"{sheet_hash}\0{assignment}" if run_id is None else f"{sheet_hash}\0{assignment}\0{run_id}"
+    return hashlib.sha256(text.encode()).hexdigest()[:24]
+
+
+class TaskCheckpoints:
+    """
+    Outputs of finished tasks of one run, stored as <directory>/<run_key>/task-<row>.json.
+    A task is saved as soon as it completes (through its callback), so a failed run can be resumed
+    from the first unfinished task.
+    """
+    def __init__(self, key, directory=None):
+        self.key = key
+        self.directory = os.path.join(directory or CheckpointConfig.directory, key)
+
+    def _path(self, row):
+        return os.path.join(self.directory, f"task-{row}.json")
+
+    def load(self, row):
+        """Stored output of a task row, or None."""
+        try:
+            with open(self._path(row), 'r') as checkpoint_file:
+                return json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, row, task_output):
+        exported = task_output.exported_output
+        record = {
+            'row':             row,
+            'description':     task_output.description,
+            'raw_output':      task_output.raw_output,
+            'exported_output': exported if isinstance(exported, str) or exported is None else str(exported),
+            'completed_at':    time.time(),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._path(row)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump(record, checkpoint_file)
+        os.replace(tmp_path, self._path(row))
+        logger.info(f"Saved checkpoint of task row {row}.")
+
+    def callback(self, row, previous=None):
+        """Task callback saving the output of row, then calling the task's previous callback if any."""
+        def save_checkpoint(task_output):
+            try:
+                self.save(row, task_output)
+            except Exception as e:
+                logger.error(f"Failed to save checkpoint of task row {row}: {e}")
+            if previous is not None:
+                return previous(task_output)
+        return save_checkpoint
+
+    def crew_callback(self, tasks, rows, previous=None):
+        """
+        Crew task_callback saving each task's output. Some crewai versions replace every task's callback with
+        the crew's at kickoff; the finished task is the one whose output is the TaskOutput passed in.
+        """
+        pending = dict(zip(map(id, tasks), zip(tasks, rows)))          # id(task) -> (task, row), until saved
+
+        def save_checkpoint(task_output):
+            for key, (task, row) in list(pending.items()):
+                if task.output is task_output:
+                    del pending[key]
+                    self.callback(row)(task_output)
+                    break
+            if previous is not None:
+                return previous(task_output)
+        return save_checkpoint
+
+    def clear(self):
+        """Delete the checkpoints of this run, e.g. once it completed."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def attach(self, tasks, rows, resume=False, any_order=False):
+        """
+        Save every task's output when it completes. With resume, tasks with a stored output are skipped:
+        their outputs are restored and passed as context to the first task still to run.
+        Only the leading run of finished tasks is restored, unless any_order: tasks run as a DAG finish
+        out of order and get their context from their dependencies, so every stored output is restored.
+        Returns (tasks to run, restored tasks).
+        """
+        from crewai.tasks.task_output import TaskOutput
+
+        pending, pending_rows, restored = [], [], []
+        for task, row in zip(tasks, rows):
+            record = self.load(row) if resume else None
+            if record is not None and (any_order or not pending):      # Sequential runs can only skip a finished prefix
+                task.output = TaskOutput(description=record['description'], raw_output=record['raw_output'],
+                                         exported_output=record['exported_output'])
+                restored.append(task)
+                continue
+            task.callback = self.callback(row, task.callback)
+            pending.append(task)
+            pending_rows.append(row)
+        self.pending_rows = pending_rows
+
+        if restored and pending and pending[0].context is None:         # Tasks with explicit dependencies keep their context
+            pending[0].context = restored
+        if restored:
+            logger.info(f"Resuming: {len(restored)} finished task(s) restored from {self.directory}.")
+        return pending, restored
@@ -2,7 +2,7 @@ import logging
 
 logger = logging.getLogger(__name__)
 import argparse
-from config.config import AppConfig
+from config.config import AppConfig, RateLimitConfig
 
 name, version = AppConfig.name, AppConfig.version
 
@@ -22,6 +22,10 @@ def get_parser():
     parser.add_argument('--sheet_url',
                         help='The URL of the Google Sheet.\nExample: https://docs.google.com/spreadsheets/d/123abc/ \n')
 
+    parser.add_argument('--sheet_path',
+                        help='Read the crew from a local bundle instead of a Google Sheet: a directory with\n'
+                             'Agents, Tasks, Crew, Models and Tools as .csv or .parquet files, or an .xlsx workbook.\n')
+
     parser.add_argument("--loglevel", type=str, default="ERROR", help=
     """Set the log level to control logging output. \nChoices include:
     DEBUG - Low-level system information for debugging
@@ -32,6 +36,58 @@ def get_parser():
     """)
     parser.add_argument("--env_path", type=str, default="../../ENV/.env")
 
+    parser.add_argument("--offline", action="store_true",
+                        help="Run from the local sheet snapshots only, without downloading the sheet.")
+    parser.add_argument("--sheet_cache_ttl", type=float, default=None,
+                        help="Seconds a local sheet snapshot is used without checking the sheet for changes.\nDefault: 0")
+    parser.add_argument("--no_sheet_cache", action="store_true",
+                        help="Always download the sheet and don't keep local snapshots.")
+
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run: tasks finished earlier with the same sheet and assignment\n"
+                             "are skipped and their saved outputs are passed on as context.")
+
+    parser.add_argument("--batch", metavar="PATH",
+                        help="Run the crew once per assignment in a CSV ('Assignment' column) or JSONL file.\n"
+                             "The sheet, tools and LLM clients are set up once for all runs.")
+    parser.add_argument("--batch_output", metavar="PATH",
+                        help="JSONL file the batch results are appended to.\nDefault: <batch file>.results.jsonl")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Crews run concurrently in batch and server mode.\nDefault: 4")
+
+    parser.add_argument("--serve", action="store_true",
+                        help="Keep the crew loaded and accept kickoff requests over HTTP:\n"
+                             "POST /kickoff {\"assignment\": \"...\"} and GET /health")
+    parser.add_argument("--host", default=None, help="Address the server listens on.\nDefault: 127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="Port the server listens on.\nDefault: 8765")
+    parser.add_argument("--executor", choices=["thread", "process"], default=None,
+                        help="Run the server's crews on worker threads, or on worker processes that each load\n"
+                             "the sheet once.\nDefault: thread")
+
+    parser.add_argument("--shared_rate_limits", nargs="?", const=RateLimitConfig.default_shared_state_path, default=None,
+                        metavar="PATH",
+                        help="Share provider rate limits with other crews on this host through a SQLite file.\n"
+                             f"Default path: {RateLimitConfig.default_shared_state_path}")
+
+    parser.add_argument("--trace", nargs="?", const="", default=None, metavar="PATH",
+                        help="Record where the time and tokens go (sheet, tools, LLM set up, tasks, LLM and tool calls).\n"
+                             "Prints a summary at exit and writes a JSON trace to PATH.\n"
+                             "Default path: <cache dir>/traces/trace-<time>-<pid>.json")
+
+    parser.add_argument("--tracing", metavar="BACKENDS",
+                        help="Export spans while running, comma separated: 'file' (JSON lines) and/or 'otlp'\n"
+                             "(OpenTelemetry collector over HTTP).\nDefault: $CREWAI_SHEETS_TRACING")
+    parser.add_argument("--trace_sample_rate", type=float, default=None,
+                        help="Fraction of traces recorded, from 0 to 1.\nDefault: 1")
+    parser.add_argument("--otlp_endpoint", default=None,
+                        help="OTLP/HTTP traces endpoint.\nDefault: http://localhost:4318/v1/traces")
+
+    parser.add_argument("--llm_cache", action="store_true",
+                        help="Reuse stored LLM responses for identical calls, e.g. when re-running a sheet.\n"
+                             "Only calls with temperature 0 are cached.")
+    parser.add_argument("--llm_cache_any_temperature", action="store_true",
+                        help="With --llm_cache, also reuse responses of calls with temperature > 0.")
+
     parser.add_argument("--version", action="version", version=version_string,
                         help="Show program's version number and exit")
 
@@ -0,0 +1,279 @@
+import   logging
+logger = logging.getLogger(__name__)
+import   os
+from     concurrent.futures import ThreadPoolExecutor, as_completed
+import   contextvars
+from     textwrap import dedent
+from     crewai import Crew, Task, Agent, Process
+
+from     utils.agent_crew_llm import get_llm
+from     utils.tools_mapping import ToolsMapping
+from     utils.model_registry import ModelRegistry
+from     utils.checkpoints import TaskCheckpoints, snapshot_hash, run_key
+from     utils.task_graph import parse_dependencies, run_task_graph
+from     utils.instrumentation import tracer, instrument_task
+from     config.config import AgentsConfig, CheckpointConfig
+
+
+def create_agents_from_df(row, model_registry=None, tools_mapping=None):
+    def get_agent_tools(tools_string):
+        if not tools_string:
+            return []
+        tool_names = [tool.strip() for tool in tools_string.split(',')]
+        return tools_mapping.get_agent_tools(tool_names)  # Tools are built once per run in tools_mapping
+
+    role = row.get('Agent Role', "Assistant")
+    goal = row.get('Goal', "To assist the human in their tasks")
+    model_name = row.get('Model Name', 'gpt-4-turbo-preview').strip()
+    backstory = row.get('Backstory', "...")
+    temperature = row.get('Temperature', 0.8)
+    max_iter = row.get('Max_iter', 15)
+    verbose = row.get('Verbose', True)
+    memory = row.get('Memory', True)
+    tools_string = row.get('Tools')
+    tools = get_agent_tools(tools_string)
+    allow_delegation = row.get('Allow delegation', False)
+
+    # Retrieve Agent model details
+    model_record = model_registry.get(model_name)
+
+    if model_record is None:
+        raise ValueError(f"Failed to retrieve or initialize the language model for {model_name}")
+    else:
+        llm = get_llm(
+            model_name=model_name,
+            temperature=temperature,
+            **model_record.llm_kwargs(),
+        )
+
+    # Retrieve function calling model details
+    function_calling_model_name = row.get('Function Calling Model', model_name)
+    function_calling_model_record = model_registry.get(function_calling_model_name)
+
+    if function_calling_model_record is None:
+        function_calling_llm = llm
+    else:
+        function_calling_llm = get_llm(
+            model_name=function_calling_model_record.name,
+            temperature=temperature,
+            **function_calling_model_record.llm_kwargs(),
+        )
+
+    agent_config = {
+            # agent_executor:                                            #An instance of the CrewAgentExecutor class.
+            'role':                 role,
+            'goal':                 goal,
+            'backstory':            backstory,
+            'allow_delegation':     allow_delegation,  # Whether the agent is allowed to delegate tasks to other agents.
+            'verbose':              verbose,  # Whether the agent execution should be in verbose mode.
+            'tools':                tools,  # Tools at agents disposal
+            'memory':               memory,  # Whether the agent should have memory or not.
+            'max_iter':             max_iter,
+            # TODO: Remove hardcoding #Maximum number of iterations for an agent to execute a task.
+            'llm':                  llm,  # The language model that will run the agent.
+            'function_calling_llm': function_calling_llm
+            # The language model that will the tool calling for this agent, it overrides the crew function_calling_llm.
+            # step_callback:                                             #Callback to be executed after each step of the agent execution.
+            # callbacks:                                                 #A list of callback functions from the langchain library that are triggered during the agent's execution process
+    }
+    if llm is None:                                                     # Raised, not exited: batch and server runs report it per run
+        raise ValueError(f"Couldn't create the language model '{model_name}' for agent '{role}'. "
+                         f"Please check the api keys, the model name and the configuration in the sheet.")
+    return Agent(config=agent_config)
+    
+
+
+def create_agents(agents_df, model_registry, tools_mapping, max_workers=None):
+    """
+    Create the Agents of all rows concurrently, in sheet order. LLM clients come from the pool in get_llm and
+    tools from tools_mapping, so agents sharing a model or tool still resolve it only once.
+    """
+    rows = [row for _, row in agents_df.iterrows()]
+    max_workers = max(1, min(max_workers or AgentsConfig.build_workers, len(rows)))
+    agents = [None] * len(rows)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agents") as executor:
+        futures = {executor.submit(contextvars.copy_context().run, create_agents_from_df, row,   # Keep the caller's span
+                                   model_registry=model_registry, tools_mapping=tools_mapping): index
+                   for index, row in enumerate(rows)}
+        for future in as_completed(futures):
+            agents[futures[future]] = future.result()                   # The first failure is raised as soon as it happens
+    return agents
+
+
+def get_agent_by_role(agents, desired_role):
+    return next((agent for agent in agents if agent.role == desired_role), None)
+
+
+def create_tasks_from_df(row, assignment, created_agents, **kwargs):
+    description = row['Instructions'].replace('{assignment}', assignment)
+    desired_role = row['Agent']
+
+    task = Task(
+        description=dedent(description),
+        expected_output=row['Expected Output'],
+        agent=get_agent_by_role(created_agents, desired_role)
+    )
+    return instrument_task(task, row.get('Task Name'))
+
+
+def create_crew(created_agents, created_tasks, crew_df, model_registry):
+    # Embedding model (Memory)
+    memory = crew_df['Memory'][0]
+    embedding_model = crew_df['Embedding model'].get(0)
+    embedding_record = model_registry.get(embedding_model)
+    
+    if embedding_record is None:
+        logger.info("No embedding model for crew specified in the sheet. Turning off memory.")
+        deployment_name = None
+        provider = None
+        base_url = None
+        memory = False
+        embedder_config = None
+    else:
+        deployment_name = embedding_record.deployment
+        provider = embedding_record.provider
+        base_url = embedding_record.base_url
+
+        # Create provider specific congig and load proveder specific ENV variables if it can't be avoided
+        embedder_config = {
+                "model": embedding_model,
+        }
+
+    if provider == 'azure-openai':
+        embedder_config['deployment_name'] = deployment_name  # Set azure specific config
+        # os.environ["AZURE_OPENAI_DEPLOYMENT"] = deployment_name #Wrokarond since azure
+        os.environ["OPENAI_API_KEY"] = os.environ["AZURE_OPENAI_KEY"]
+
+    if provider == 'openai':
+        embedder_config['api_key'] = os.environ.get("SECRET_OPENAI_API_KEY")
+        os.environ["OPENAI_BASE_URL"] = "https://api.openai.com/v1"
+    
+    if provider == 'ollama':
+        if base_url is not None:
+            embedder_config['base_url'] = base_url
+
+    elif embedder_config is not None :  # Any other openai compatible e.g. ollama or llama-cpp
+        provider = 'openai'
+        api_key = 'NA'
+        embedder_config['base_url'] = base_url
+        embedder_config['api_key'] = api_key
+
+    # Groq doesn't have an embedder
+
+    # Manager LLM
+    manager_model = crew_df['Manager LLM'][0]
+    manager_record = model_registry.get(manager_model)
+    manager_temperature = crew_df['t'][0]
+    manager_num_ctx = crew_df['num_ctx'][0]
+    manager_llm = None
+
+    if manager_record is not None and manager_record.provider is not None:
+        manager_llm = get_llm(
+            model_name=manager_model,
+            temperature=manager_temperature,
+            **dict(manager_record.llm_kwargs(), num_ctx=manager_num_ctx),
+        )
+
+    verbose = crew_df['Verbose'][0]
+    process = Process.hierarchical if crew_df['Process'][0] == 'hierarchical' else Process.sequential
+
+    return Crew(
+        agents=created_agents,
+        tasks=created_tasks,
+        verbose=verbose,
+        process=process,
+        memory=memory,
+        manager_llm=manager_llm,
+        embedder={
+                "provider": provider,
+                "config":   embedder_config
+        }
+    )
+
+
+
+class CrewBuilder:
+    """
+    Builds crews from one sheet. The Models sheet is indexed and the tools are created once; every crew then
+    gets its own Agents and Tasks, which reuse the pooled LLM clients and the shared tools.
+    """
+    def __init__(self, agents_df, tasks_df, crew_df, models_df, tools_df):
+        self.agents_df, self.tasks_df, self.crew_df = agents_df, tasks_df, crew_df
+        self.sheet_hash = snapshot_hash(agents_df, tasks_df, crew_df, models_df, tools_df)
+        self.dependencies = parse_dependencies(tasks_df)
+        with tracer.span("model registry", kind='setup'):
+            self.model_registry = ModelRegistry(models_df)
+        with tracer.span("load tools", kind='setup'):
+            self.tools_mapping = ToolsMapping(tools_df, self.model_registry)
+
+    @property
+    def assignment(self):
+        """The assignment in the Crew sheet."""
+        return self.crew_df['Assignment'][0]
+
+    def build(self, assignment=None, resume=False, run_id=None):
+        """
+        Create the crew for an assignment (default: the sheet's). Task outputs are checkpointed; with resume,
+        tasks finished in an earlier run of the same sheet, assignment and run_id are skipped.
+        Returns (crew, restored tasks). crew is None if every task already finished.
+        """
+        assignment = self.assignment if assignment is None else assignment
+        with tracer.span("create agents", kind='setup'):
+            agents = create_agents(self.agents_df, self.model_registry, self.tools_mapping)
+        tasks = [create_tasks_from_df(row, assignment, agents) for _, row in self.tasks_df.iterrows()]
+        if self.has_dependencies:
+            tasks_by_row = dict(zip(self.tasks_df.index, tasks))
+            for row, task in tasks_by_row.items():
+                task.context = [tasks_by_row[parent] for parent in self.dependencies[row]]
+                task.__dict__['_sheet_row'] = row                       # Restored tasks aren't a prefix, see kickoff
+
+        restored, checkpoints = [], None
+        if CheckpointConfig.enabled:
+            checkpoints = TaskCheckpoints(run_key(self.sheet_hash, assignment, run_id))
+            tasks, restored = checkpoints.attach(tasks, self.tasks_df.index, resume=resume,
+                                                 any_order=self.has_dependencies)
+        if not tasks:
+            return None, restored
+        crew = create_crew(agents, tasks, self.crew_df, self.model_registry)
+        if checkpoints is not None:
+            crew.task_callback = checkpoints.crew_callback(tasks, checkpoints.pending_rows, crew.task_callback)
+        return crew, restored
+
+    @property
+    def has_dependencies(self):
+        """True if the Tasks sheet names any task in 'Depends on'."""
+        return any(self.dependencies.values())
+
+    def kickoff(self, crew, restored=(), assignment=None, run_id=None):
+        """
+        Run a crew from build for the same assignment and run_id. A sequential crew with task dependencies
+        runs its tasks as a DAG, independent tasks concurrently; otherwise this is crew.kickoff().
+        The run's checkpoints are deleted once it succeeded.
+        """
+        with tracer.span("crew kickoff", kind='crew', process=str(crew.process)):
+            if not self.has_dependencies or crew.process != Process.sequential:
+                result = crew.kickoff()
+            else:
+                by_row = {task.__dict__['_sheet_row']: task for task in list(restored) + list(crew.tasks)}
+                tasks = {row: by_row[row] for row in self.tasks_df.index}
+                done = [task.__dict__['_sheet_row'] for task in restored]
+                result = run_task_graph(crew, tasks, self.dependencies, done=done)
+        self.clear_checkpoints(assignment, run_id)
+        return result
+
+    def clear_checkpoints(self, assignment=None, run_id=None):
+        """Delete the checkpoints of a completed run, unless CheckpointConfig.keep_completed."""
+        if CheckpointConfig.enabled and not CheckpointConfig.keep_completed:
+            assignment = self.assignment if assignment is None else assignment
+            TaskCheckpoints(run_key(self.sheet_hash, assignment, run_id)).clear()
+
+    def run(self, assignment=None, resume=False, run_id=None):
+        """
+        Build and kick off the crew for an assignment. Returns the result of the last task.
+        Runs that may share an assignment concurrently (batch rows) need distinct run_ids for their checkpoints.
+        """
+        crew, restored = self.build(assignment, resume, run_id)
+        if crew is None:
+            self.clear_checkpoints(assignment, run_id)
+            return restored[-1].output.raw_output
+        return self.kickoff(crew, restored, assignment, run_id)
@@ -0,0 +1,177 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import ServerConfig, SchedulerConfig
+from     http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from     utils.sheets_loader import Sheets
+from     utils.checkpoints import snapshot_hash
+from     utils.crew_builder import CrewBuilder
+from     utils.agent_crew_llm import clear_llm_pool
+from     utils.job_scheduler import JobScheduler, QueueFull
+from     utils.instrumentation import tracer
+import   json
+import   threading
+import   time
+
+
+class CrewService:
+    """
+    A sheet kept warm for many kickoffs: the CrewBuilder (model registry, tools) is built once and the LLM
+    clients stay pooled. The sheet is re-read at most every reload_interval seconds, through the local
+    snapshot cache, and the builder is only rebuilt when the sheet's content actually changed.
+    """
+    def __init__(self, location, reload_interval=None):
+        self.location = location
+        self.reload_interval = ServerConfig.reload_interval if reload_interval is None else reload_interval
+        self.builder = None
+        self.checked_at = 0
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def get_builder(self):
+        """Current CrewBuilder, reloading the sheet if it changed. Raises if the sheet can't be read."""
+        with self.lock:
+            if self.builder is not None and time.monotonic() - self.checked_at < self.reload_interval:
+                return self.builder
+            dataframes = Sheets.read_sheet(self.location)
+            if isinstance(dataframes, Exception):
+                if self.builder is None:
+                    raise dataframes
+                logger.error(f"Failed to re-read the sheet, keeping the loaded one: {dataframes}")
+            elif self.builder is None or snapshot_hash(*dataframes) != self.builder.sheet_hash:
+                if self.builder is not None:
+                    logger.info("Sheet changed. Reloading the crew.")
+                    clear_llm_pool()                                    # Drop clients of the old Models rows
+                else:
+                    logger.info("Sheet loaded.")
+                self.builder = CrewBuilder(*dataframes)
+                self.loaded_at = time.time()
+            self.checked_at = time.monotonic()
+            return self.builder
+
+    def kickoff(self, assignment=None, resume=False):
+        """Run the crew for an assignment (default: the sheet's). Returns a JSON-ready dict."""
+        started = time.monotonic()
+        with tracer.span("server job", kind='run', resume=resume):         # One trace per job, sheet reload included
+            builder = self.get_builder()
+            result = builder.run(assignment, resume=resume)
+        return {'result': str(result), 'sheet_hash': builder.sheet_hash, 'seconds': round(time.monotonic() - started, 2)}
+
+    def health(self):
+        return {
+            'status':     'ok',
+            'sheet':      self.location,
+            'sheet_hash': self.builder.sheet_hash if self.builder else None,
+            'loaded_at':  self.loaded_at,
+        }
+
+
+_worker_service = None                                                  # CrewService of a worker process
+
+
+def _init_worker(location):
+    global _worker_service
+    _worker_service = CrewService(location)
+    _worker_service.get_builder()
+
+
+def _run_in_worker(assignment=None, resume=False):
+    return _worker_service.kickoff(assignment, resume=resume)
+
+
+def make_scheduler(service, workers=None, executor=None):
+    """Job scheduler running the service's crews on threads, or on processes each holding their own copy of the sheet."""
+    if (executor or SchedulerConfig.executor) == 'process':
+        return JobScheduler(_run_in_worker, workers=workers, executor='process',
+                            initializer=_init_worker, initargs=(service.location,))
+    return JobScheduler(service.kickoff, workers=workers, executor='thread')
+
+
+class CrewRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the crew server:
+        GET  /health     - service status, the hash of the loaded sheet and job counts
+        POST /kickoff    - {"assignment": "...", "resume": false}, runs the crew and returns its result
+        POST /jobs       - same body, queues the run and answers 202 with the job id
+        GET  /jobs       - all known jobs
+        GET  /jobs/<id>  - status of a job, with its result or error once finished
+    Runs are refused with 503 while the scheduler's queue is full.
+    """
+    service = None                                                      # Set by make_server
+    scheduler = None
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = json.loads(self.rfile.read(length))
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object.")
+        return body
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/health':
+            return self._send(200, dict(self.service.health(), jobs=self.scheduler.stats()))
+        if path == '/jobs':
+            return self._send(200, {'jobs': [job.to_dict() for job in self.scheduler.list()]})
+        if path.startswith('/jobs/'):
+            job = self.scheduler.get(path[len('/jobs/'):])
+            if job is None:
+                return self._send(404, {'error': f"Unknown job '{path[len('/jobs/'):]}'"})
+            return self._send(200, job.to_dict())
+        self._send(404, {'error': f"Unknown path '{self.path}'"})
+
+    def do_POST(self):
+        path = self.path.rstrip('/')
+        if path not in ('/kickoff', '/jobs'):
+            return self._send(404, {'error': f"Unknown path '{self.path}'"})
+        try:
+            body = self._read_json()
+        except ValueError as e:
+            return self._send(400, {'error': f"Invalid JSON body: {e}"})
+        try:
+            job = self.scheduler.submit(body.get('assignment'), resume=bool(body.get('resume')))
+        except QueueFull as e:
+            return self._send(503, {'error': str(e)}, {'Retry-After': '5'})
+        if path == '/jobs':
+            return self._send(202, {'id': job.id, 'status': job.status, 'url': f"/jobs/{job.id}"})
+        try:
+            self._send(200, job.future.result())
+        except Exception as e:
+            logger.error(f"Kickoff failed: {e}")
+            self._send(500, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+def make_server(service, scheduler, host=None, port=None, handler=CrewRequestHandler):
+    """HTTP server for a CrewService. Requests are handled on their own threads, crews run on the scheduler."""
+    handler = type(handler.__name__, (handler,), {'service': service, 'scheduler': scheduler})
+    return ThreadingHTTPServer((host or ServerConfig.host, port or ServerConfig.port), handler)
+
+
+def serve(location, host=None, port=None, workers=None, executor=None):
+    """Load the sheet once and serve kickoff requests until interrupted."""
+    service = CrewService(location)
+    with tracer.span("server start", kind='run'):
+        service.get_builder()                                           # Fail fast and warm up before accepting requests
+    scheduler = make_scheduler(service, workers, executor)
+    server = make_server(service, scheduler, host, port)
+    logger.info(f"Crew server listening on http://{server.server_address[0]}:{server.server_address[1]} "
+                f"with {scheduler.workers} {scheduler.kind} workers")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        scheduler.shutdown(wait=False)
@@ -1,7 +1,6 @@
 from __future__ import annotations
-import time
 import logging
-import asyncio
+import inspect
 from typing import (Any,AsyncIterator,Iterator,List,Optional,Union)
 from langchain_core.callbacks import (AsyncCallbackManagerForLLMRun,CallbackManagerForLLMRun,)
 from langchain_core.language_models.chat_models import (agenerate_from_stream,generate_from_stream)
@@ -11,7 +10,8 @@ from langchain_core.pydantic_v1 import BaseModel
 from langchain_groq import ChatGroq
 from langchain_groq.chat_models import _convert_delta_to_message_chunk, _convert_dict_to_message 
 from rich.console import Console
-import tiktoken
+from utils.tokenizers import get_encoder, count_tokens
+from utils.rate_limiter import RateLimitCoordinator, parse_duration, parse_retry_after
 #from tiktoken.core import Encoding
 #from tiktoken.model import encoding_for_model, encoding_name_for_model
 #from tiktoken.registry import get_encoding, list_encoding_names
@@ -20,33 +20,59 @@ console = Console()
 logger = logging.getLogger(__name__)
 
 class Throttle:
-    def __init__(self, rate_limit:int = None, average_token_length:int=5, model_name='gpt-4'):
+    """
+    Tokens-per-minute throttle for Groq. Bookkeeping is done by a bucket from the RateLimitCoordinator,
+    so every client using the same (provider, model, api key) shares one budget, optionally across
+    processes. Without a rate limit nothing is throttled.
+    """
+    def __init__(self, rate_limit:int = None, average_token_length:int=5, model_name='gpt-4',
+                 provider:str = 'groq', model:str = None, api_key:str = None):
+        self.rate_limit = rate_limit
+        self.model_name = model_name
+        self.average_token_length = average_token_length
+        self.bucket = None
+        self.headers_seen = False                                           # Budget is learned from response headers
         try:
             if rate_limit is None:
                 logger.debug("Rate limit for Grog is not set. Not throtelling.")
             else:
                 logger.debug("Rate limit for Grog is set. Setting up throtelling.")
-                self.model_name = model_name
-                self.rate_limit = rate_limit
-                self.enc = tiktoken.encoding_for_model(model_name)
-                self.average_token_length = average_token_length
-                self.last_time_called = time.time()
-                self.ratelimit_remaining_tokens = self.rate_limit
+                self.bucket = RateLimitCoordinator().get_bucket(provider, model or model_name, rate_limit, api_key)
                 
                 logger.debug(f"/nThrottle Rate limit: {self.rate_limit}")
                 logger.debug(f"Average token length : {self.average_token_length}")
         except Exception as e:
             logger.error(f"Failed to configure Throttle: {e}")
 
+    @property
+    def enc(self):
+        """Shared tiktoken encoder, loaded the first time tokens are counted."""
+        return get_encoder(self.model_name)
+
+    @property
+    def ratelimit_remaining_tokens(self):
+        """Tokens that can be used right now without waiting."""
+        return self.bucket.remaining if self.bucket is not None else self.rate_limit
+
+    @ratelimit_remaining_tokens.setter
+    def ratelimit_remaining_tokens(self, tokens):
+        if self.bucket is not None:
+            self.bucket.remaining = tokens
+
         
     def calculate_tokens(self, text=None):
         """Estimate number of tokens using the specific encoding model."""
         if text is None:
             return 0
+        return self.calculate_message_tokens([text])
+
+    def calculate_message_tokens(self, messages):
+        """Estimate number of tokens of a conversation: the sum of the cached counts of its messages."""
+        if self.bucket is None:                                         #Nothing to throttle, don't encode
+            return 0
         try:
-            encoded_text = self.enc.encode(text)
-            token_count = len(encoded_text)* 1.1                        #10$ safety margin
-            logging.debug(f"Text: {text}")
+            token_count = sum(count_tokens(self.enc, getattr(message, 'content', message)) for message in messages)
+            token_count = token_count * 1.1                             #10$ safety margin
             logging.debug(f"Token count: {token_count}")
             if token_count > self.rate_limit:
                 exception = Exception(f"Token count exceeds rate limit: Token count:{token_count} Rate limit: {self.rate_limit} \n\
@@ -75,41 +101,58 @@ class Throttle:
     def _update_tokens(self):
         """Update tokens based on elapsed time."""
         try:
-            if self.rate_limit is None:                                     #Don't throttle if rate limit is not set
+            if self.bucket is None:                                         #Don't throttle if rate limit is not set
                 return
-            
-            now = time.time() 
-            elapsed = int(now - self.last_time_called)                      #Elapsed time in seconds 
-            tps = self.rate_limit // 60                                     #Tokens per second accumulated
-            self.ratelimit_remaining_tokens += elapsed * tps                        #Accumulated tokens sine last call   
-            self.last_time_called = now                                     #Update last call time
             logger.debug(f"ratelimit_remaining_tokens:{self.ratelimit_remaining_tokens}")
         except Exception as e:
             logger.error(f"Failed to update tokens: {e}")
             return 0
 
-    def wait(self, tokens_needed: int):
-        """Delay execution to respect the throttle limit."""
+    def observe_headers(self, headers):
+        """Adapt the budget to the x-ratelimit-*-tokens headers of a response. The static limits remain the fallback."""
+        if self.bucket is None or headers is None:
+            return
         try:
-            if self.rate_limit is None:                                     #Don't throttle if rate limit is not set    
+            remaining = headers.get('x-ratelimit-remaining-tokens')
+            if remaining is None:
                 return
-            
-            self._update_tokens()
+            limit = headers.get('x-ratelimit-limit-tokens')
+            reset_after = parse_duration(headers.get('x-ratelimit-reset-tokens'))
+            self.bucket.observe(remaining=float(remaining), limit=float(limit) if limit else None, reset_after=reset_after)
+            self.headers_seen = True
+            logger.debug(f"Rate limit from headers: remaining {remaining}, limit {limit}, reset in {reset_after}s")
+        except Exception as e:
+            logger.error(f"Failed to read rate limit headers: {e}")
 
-            if self.ratelimit_remaining_tokens >= tokens_needed:                    # If accumulated tokens exceed the needed
-                self.ratelimit_remaining_tokens -= tokens_needed                    # Deduct the tokens needed
-                return                                                      # No need to wait
+    def observe_error(self, error):
+        """Back off for the Retry-After (or token reset) time of a 429 response."""
+        response = getattr(error, 'response', None)
+        if self.bucket is None or getattr(error, 'status_code', None) != 429 or response is None:
+            return
+        try:
+            self.observe_headers(response.headers)
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+            if retry_after is None:
+                retry_after = parse_duration(response.headers.get('x-ratelimit-reset-tokens'))
+            if retry_after:
+                self.bucket.penalize(retry_after)
+                logger.info(f"Groq rate limit hit. Next request waits at least {retry_after:.2f}s.")
+        except Exception as e:
+            logger.error(f"Failed to read rate limit error: {e}")
 
-            # Calculate sleep time to accumulate needed tokens
-            tps = self.rate_limit // 60                                     # Tokens per second
-            tokens_defecit = tokens_needed - self.ratelimit_remaining_tokens         
-            sleep_time = tokens_defecit // tps                              
-            logger.debug(f"tokens_needed: {tokens_needed}")
-            logger.debug(f"sleep_time: {sleep_time}")
-            time.sleep(sleep_time)
+    def release(self, tokens: int):
+        """Give back reserved tokens that were not used, e.g. the unused part of max_tokens."""
+        if self.bucket is not None and tokens > 0:
+            self.bucket.release(tokens)
 
-            self._update_tokens()                                           # Update tokens after sleep
-            self.ratelimit_remaining_tokens -= tokens_needed
+    def wait(self, tokens_needed: int):
+        """Delay execution to respect the throttle limit."""
+        try:
+            if self.bucket is None:                                         #Don't throttle if rate limit is not set    
+                return
+            waited = self.bucket.acquire(tokens_needed)
+            logger.debug(f"tokens_needed: {tokens_needed}")
+            logger.debug(f"waited: {waited:.2f}s")
         except Exception as e:
             logger.error(f"Failed to wait: {e}")
             return 0
@@ -117,27 +160,11 @@ class Throttle:
     async def await_(self, tokens_needed: int):
         """Asynchronous version of the wait."""
         try:
-            if self.rate_limit is None:                                     #Don't throttle if rate limit is not set    
+            if self.bucket is None:                                         #Don't throttle if rate limit is not set    
                 return
-            
-            self._update_tokens()
-
-            if self.ratelimit_remaining_tokens >= tokens_needed:                    # If accumulated tokens exceed the needed
-                self.ratelimit_remaining_tokens -= tokens_needed                    # Deduct the tokens needed
-                return                                                      # No need to wait
-
-            # Calculate sleep time to accumulate needed tokens
-            tps = self.rate_limit // 60                                     # Tokens per second
-            tokens_defecit = tokens_needed - self.ratelimit_remaining_tokens         
-            sleep_time = tokens_defecit // tps                              
+            waited = await self.bucket.acquire_async(tokens_needed)
             logger.debug(f"tokens_needed: {tokens_needed}")
-            logger.debug(f"sleep_time: {sleep_time}")
-            
-            await asyncio.sleep(sleep_time)
-
-            # Update tokens after sleep and adjust for token usage
-            self._update_tokens()
-            self.ratelimit_remaining_tokens -= tokens_needed
+            logger.debug(f"waited: {waited:.2f}s")
         except Exception as e:
             logger.error(f"Failed to await: {e}")
             return 0    
@@ -149,13 +176,41 @@ class TokenThrottledChatGroq(ChatGroq):
         
         # SET UP THROTTLE
         self.rate_limit = rate_limit if rate_limit else None
-        self.throttle = Throttle(rate_limit=self.rate_limit)
+        api_key = self.groq_api_key.get_secret_value() if getattr(self, 'groq_api_key', None) else None
+        self.throttle = Throttle(rate_limit=self.rate_limit, model=self.model_name, api_key=api_key)
     
     # OVERRIDE pydantic_v1 BaseModel
     rate_limit: Optional[int] = None 
     throttle: Throttle = Throttle(rate_limit=None)
     """Throttle settings for token generation."""    
 
+    def _create(self, **params):
+        """client.create with the raw response, so the throttle can learn the budget from its headers."""
+        create = getattr(self.client, 'with_raw_response', self.client).create
+        try:
+            response = create(**params)
+        except Exception as e:
+            self.throttle.observe_error(e)
+            raise
+        if not hasattr(response, 'parse'):                                  # SDK without raw responses
+            return response
+        self.throttle.observe_headers(response.headers)
+        return response.parse()
+
+    async def _acreate(self, **params):
+        """Async version of _create."""
+        create = getattr(self.async_client, 'with_raw_response', self.async_client).create
+        try:
+            response = await create(**params)
+        except Exception as e:
+            self.throttle.observe_error(e)
+            raise
+        if not hasattr(response, 'parse'):
+            return response
+        self.throttle.observe_headers(response.headers)
+        parsed = response.parse()
+        return await parsed if inspect.isawaitable(parsed) else parsed
+
     def _generate(
         self,
         messages: List[BaseMessage],
@@ -169,10 +224,7 @@ class TokenThrottledChatGroq(ChatGroq):
         #    logger.debug("Debug: Type of message.content is", type(message.content))
         #    logger.debug("Debug: message.content is", message.content)
 
-        input_text = ""
-        for message in messages:
-            input_text = input_text + message.content
-        input_tokens = self.throttle.calculate_tokens(input_text)  # Simplistic token count for input
+        input_tokens = self.throttle.calculate_message_tokens(messages)  # Only new messages are encoded
         total_tokens = input_tokens + self.max_tokens                       #Assume we will get max_tokens
         self.throttle.wait(total_tokens)
         
@@ -181,7 +233,7 @@ class TokenThrottledChatGroq(ChatGroq):
             return generate_from_stream(stream_iter)
         message_dicts, params = self._create_message_dicts(messages, stop)
         params = {**params, **kwargs}
-        response = self.client.create(messages=message_dicts, **params)
+        response = self._create(messages=message_dicts, **params)
         #logger.debug("Response: ", response)
 
 
@@ -199,12 +251,9 @@ class TokenThrottledChatGroq(ChatGroq):
         #    logger.debug("Debug: Type of message.content is", type(message.content))
         #    logger.debug("Debug: message.content is", message.content)
 
-        input_text = ""
-        for message in messages:
-            input_text = input_text + message.content
-        input_tokens = self.throttle.calculate_tokens(input_text)  # Simplistic token count for input
+        input_tokens = self.throttle.calculate_message_tokens(messages)  # Only new messages are encoded
         total_tokens = input_tokens + self.max_tokens
-        self.throttle.await_(total_tokens)  
+        await self.throttle.await_(total_tokens)  
         
         if self.streaming:
             stream_iter = self._astream(messages, stop=stop, run_manager=run_manager, **kwargs)
@@ -215,7 +264,7 @@ class TokenThrottledChatGroq(ChatGroq):
             **params,
             **kwargs,
         }
-        response = await self.async_client.create(messages=message_dicts, **params)
+        response = await self._acreate(messages=message_dicts, **params)
         #logger.debug("Response: ", response)
         #logger.debug("Response type: ", type(response))
         return self._create_chat_result(response)
@@ -232,10 +281,7 @@ class TokenThrottledChatGroq(ChatGroq):
         #    logger.debug("Debug: Type of message.content is", type(message.content))
         #    logger.debug("Debug: message.content is", message.content)
 
-        input_text = ""
-        for message in messages:
-            input_text = input_text + message.content
-        input_tokens = self.throttle.calculate_tokens(input_text)  # Simplistic token count for input
+        input_tokens = self.throttle.calculate_message_tokens(messages)  # Only new messages are encoded
         total_tokens = input_tokens + self.max_tokens  
         self.throttle.wait(total_tokens)
 
@@ -243,7 +289,7 @@ class TokenThrottledChatGroq(ChatGroq):
 
         # groq api does not support streaming with tools yet
         if "tools" in kwargs:
-            response = self.client.create(
+            response = self._create(
                 messages=message_dicts, **{**params, **kwargs}
             )
             chat_result = self._create_chat_result(response)
@@ -279,7 +325,7 @@ class TokenThrottledChatGroq(ChatGroq):
         params = {**params, **kwargs, "stream": True}
 
         default_chunk_class = AIMessageChunk
-        for chunk in self.client.create(messages=message_dicts, **params):
+        for chunk in self._create(messages=message_dicts, **params):
             if not isinstance(chunk, dict):
                 chunk = chunk.dict()
             if len(chunk["choices"]) == 0:
@@ -313,19 +359,16 @@ class TokenThrottledChatGroq(ChatGroq):
         #    logger.debug("Debug: Type of message.content is", type(message.content))
         #    logger.debug("Debug: message.content is", message.content)
 
-        input_text = ""
-        for message in messages:
-            input_text = input_text + message.content
-        input_tokens = self.throttle.calculate_tokens(input_text)  # Simplistic token count for input
+        input_tokens = self.throttle.calculate_message_tokens(messages)  # Only new messages are encoded
         total_tokens = input_tokens + self.max_tokens
-        self.throttle.wait(total_tokens) 
+        await self.throttle.await_(total_tokens)                            # Don't block the event loop
 
         
         message_dicts, params = self._create_message_dicts(messages, stop)
 
         # groq api does not support streaming with tools yet
         if "tools" in kwargs:
-            response = await self.async_client.create(
+            response = await self._acreate(
                 messages=message_dicts, **{**params, **kwargs}
             )
             chat_result = self._create_chat_result(response)
@@ -361,7 +404,7 @@ class TokenThrottledChatGroq(ChatGroq):
         params = {**params, **kwargs, "stream": True}
 
         default_chunk_class = AIMessageChunk
-        async for chunk in await self.async_client.create(
+        async for chunk in await self._acreate(
             messages=message_dicts, **params
         ):
             if not isinstance(chunk, dict):
@@ -410,6 +453,7 @@ class TokenThrottledChatGroq(ChatGroq):
             "system_fingerprint": response.get("system_fingerprint", ""),
         }
         #logger.debug("token_usage: ", token_usage)
-        self.throttle.ratelimit_remaining_tokens += self.max_tokens - token_usage['total_tokens'] #Trottle: release unused tokens TODO: call function
+        if not self.throttle.headers_seen:                                  # Headers already report the real budget
+            self.throttle.release(self.max_tokens - token_usage.get('completion_tokens', self.max_tokens)) #Trottle: release unused tokens
         self.throttle._update_tokens()
         return ChatResult(generations=generations, llm_output=llm_output) 
@@ -3,6 +3,8 @@ logger = logging.getLogger(__name__)
 logger.debug(f"Entered {__file__}")
 import pkgutil
 import importlib
+import importlib.util
+import ast
 
 logger = logging.getLogger(__name__)
 logger.debug(f"Entered the module {__file__}")
@@ -44,3 +46,123 @@ def import_package_modules(package, modules_list, integration_dict, recursive=Fa
         except ImportError as e:
             logger.warning(f"Failed to import {name}: {e}")
 
+
+def index_package_modules(package_name, index, reexports=None, recursive=True):
+    """
+    Indexes public classes and functions of a package without importing its submodules. Module sources
+    are parsed with ast, so only the package's parent packages get imported to locate it.
+
+    Args:
+        package_name (str): Dotted name of the package to index, e.g. 'langchain_community.tools'.
+        index (dict): Dictionary to which '<module>:<attribute>' targets are added, keyed by simple name.
+                      Each value is a list, as the same simple name may be defined in several modules.
+        reexports (dict): Optional dictionary to which re-exported names are added,
+                      '<module>:<name>' -> '<source module>:<attribute>'. Used to resolve aliases to definitions.
+        recursive (bool): If True, indexes subpackages recursively.
+
+    Returns:
+        None: Modifies index and reexports in-place.
+    """
+    reexports = {} if reexports is None else reexports
+    try:
+        spec = importlib.util.find_spec(package_name)
+    except (ImportError, ValueError) as e:
+        logger.warning(f"Failed to locate {package_name}: {e}")
+        return
+    if spec is None:
+        logger.warning(f"Failed to locate {package_name}: package not found")
+        return
+
+    _index_module_source(package_name, spec.origin, bool(spec.submodule_search_locations), index, reexports)
+    for path in spec.submodule_search_locations or []:
+        _index_package_path(package_name, path, index, reexports, recursive)
+
+
+def _index_package_path(package_name, path, index, reexports, recursive):
+    """Index every module found in one package directory."""
+    for finder, name, ispkg in pkgutil.iter_modules([path]):
+        if not name.isidentifier():                                         # e.g. 'file_tool_(depricated)' can't be imported
+            continue
+        full_name = f"{package_name}.{name}"
+        spec = finder.find_spec(full_name)
+        if spec is None:
+            continue
+        _index_module_source(full_name, spec.origin, ispkg, index, reexports)
+        if recursive and ispkg:
+            for sub_path in spec.submodule_search_locations or []:
+                _index_package_path(full_name, sub_path, index, reexports, recursive)
+
+
+def _index_module_source(module_name, origin, is_package, index, reexports):
+    """Parse one module source file and add its public definitions and re-exports to the index."""
+    if not origin or not origin.endswith('.py'):                            # Namespace packages and compiled extensions
+        return
+    try:
+        with open(origin, 'rb') as source_file:
+            tree = ast.parse(source_file.read(), filename=origin)
+    except (OSError, SyntaxError, ValueError) as e:
+        logger.warning(f"Failed to index {module_name}: {e}")
+        return
+
+    for node in _top_level_nodes(tree.body):
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            if not node.name.startswith('_'):
+                _add_to_index(index, node.name, f"{module_name}:{node.name}")
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):                 # e.g. tool = StructuredTool.from_function(...)
+            for name in _assigned_names(node.targets if isinstance(node, ast.Assign) else [node.target]):
+                if not name.startswith('_'):
+                    _add_to_index(index, name, f"{module_name}:{name}")
+        elif isinstance(node, ast.ImportFrom):
+            source_module = _resolve_import_from(node, module_name, is_package)
+            if source_module is None:
+                continue
+            for alias in node.names:
+                exported_name = alias.asname or alias.name
+                if alias.name == '*' or exported_name.startswith('_'):
+                    continue
+                reexports[f"{module_name}:{exported_name}"] = f"{source_module}:{alias.name}"
+    logger.debug(f"Indexed module: {module_name}")
+
+
+_TRY_NODES = (ast.Try,) + ((ast.TryStar,) if hasattr(ast, 'TryStar') else ())     # try/except* is Python 3.11+
+
+
+def _top_level_nodes(body):
+    """Statements of a module body, including those inside top-level try/except and if blocks
+    (optional imports, version checks)."""
+    for node in body:
+        if isinstance(node, _TRY_NODES):
+            yield from _top_level_nodes(node.body + node.orelse + node.finalbody)
+            for handler in node.handlers:
+                yield from _top_level_nodes(handler.body)
+        elif isinstance(node, ast.If):
+            yield from _top_level_nodes(node.body + node.orelse)
+        else:
+            yield node
+
+
+def _assigned_names(targets):
+    """Names bound by assignment targets, unpacking tuples and lists."""
+    for target in targets:
+        if isinstance(target, ast.Name):
+            yield target.id
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            yield from _assigned_names(target.elts)
+
+
+def _resolve_import_from(node, module_name, is_package):
+    """Return the absolute module name of a 'from ... import ...' statement."""
+    if node.level == 0:
+        return node.module
+    package_parts = module_name.split('.') if is_package else module_name.split('.')[:-1]
+    if node.level > 1:
+        package_parts = package_parts[:-(node.level - 1)]
+    if not package_parts:
+        return None
+    return '.'.join(package_parts + ([node.module] if node.module else []))
+
+
+def _add_to_index(index, name, target):
+    targets = index.setdefault(name, [])
+    if target not in targets:
+        targets.append(target)
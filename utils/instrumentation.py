@@ -0,0 +1,277 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import InstrumentationConfig, TracingConfig
+from     collections import deque
+from     contextlib import contextmanager
+import   atexit
+import   contextvars
+import   functools
+import   json
+import   os
+import   random
+import   secrets
+import   threading
+import   time
+
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_NOT_SAMPLED = object()                                                 # Current span of a trace left out by sampling
+
+
+class Span:
+    """
+    One timed phase of a run: sheet fetch, tool construction, a task, an LLM or tool call...
+    Token counts of LLM calls are added to the call's span and to all its ancestors, so a task's span
+    carries the tokens its agent spent.
+    """
+    def __init__(self, name, kind='internal', parent=None, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes or {})
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.error = None
+        self.thread = threading.current_thread().name
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_tokens(self, prompt_tokens=0, completion_tokens=0):
+        span = self
+        while span is not None:
+            span.prompt_tokens += prompt_tokens or 0
+            span.completion_tokens += completion_tokens or 0
+            span = span.parent
+
+    @property
+    def end(self):
+        return self.start + (self.duration or 0)
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self):
+        return {
+            'trace_id':          self.trace_id,
+            'span_id':           self.span_id,
+            'parent_id':         self.parent.span_id if self.parent is not None else None,
+            'name':              self.name,
+            'kind':              self.kind,
+            'start':             self.start,
+            'duration':          self.duration,
+            'thread':            self.thread,
+            'prompt_tokens':     self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'error':             self.error,
+            'attributes':        {key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                                  for key, value in self.attributes.items()},
+        }
+
+
+class Tracer:
+    """
+    Records spans of the process when InstrumentationConfig.enabled is on or exporters are set, and does
+    nothing otherwise. The parent of a span is the span active in the current thread (or context) when it
+    starts; work handed to a thread pool keeps its parent when submitted with contextvars.copy_context().run.
+    Whether a trace is recorded is decided once at its root span, with probability TracingConfig.sample_rate.
+    Finished spans are kept in memory, at most InstrumentationConfig.max_spans of them, and handed to
+    each exporter (see utils.tracing).
+    """
+    def __init__(self):
+        self.finished = deque(maxlen=InstrumentationConfig.max_spans)
+        self.exporters = []
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return InstrumentationConfig.enabled or bool(self.exporters)
+
+    def _export(self, span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                logger.error(f"{type(exporter).__name__} failed to export span '{span.name}': {e}")
+
+    @contextmanager
+    def span(self, name, kind='internal', **attributes):
+        """Time the enclosed block as a span. Yields the span, or None when instrumentation is off."""
+        parent = _current_span.get()
+        if not self.enabled or parent is _NOT_SAMPLED:
+            yield None
+            return
+        if parent is None and random.random() >= TracingConfig.sample_rate:
+            token = _current_span.set(_NOT_SAMPLED)                     # Children of the root skip recording too
+            try:
+                yield None
+            finally:
+                _current_span.reset(token)
+            return
+        span = Span(name, kind, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(None if isinstance(e, SystemExit) and not e.code else e)
+            raise
+        else:
+            span.finish()
+        finally:
+            _current_span.reset(token)
+            with self.lock:
+                self.finished.append(span)
+            self._export(span)
+
+    def current(self):
+        span = _current_span.get()
+        return None if span is _NOT_SAMPLED else span
+
+    def spans(self):
+        with self.lock:
+            return list(self.finished)
+
+    def clear(self):
+        with self.lock:
+            self.finished.clear()
+
+    def summary(self):
+        """Spans grouped by (kind, name): count, total/mean/max seconds, errors and tokens. Slowest total first."""
+        groups = {}
+        for span in self.spans():
+            group = groups.setdefault((span.kind, span.name), {
+                'kind': span.kind, 'name': span.name, 'count': 0, 'total': 0.0, 'max': 0.0,
+                'errors': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            group['count'] += 1
+            group['total'] += span.duration or 0
+            group['max'] = max(group['max'], span.duration or 0)
+            group['errors'] += span.error is not None
+            group['prompt_tokens'] += span.prompt_tokens
+            group['completion_tokens'] += span.completion_tokens
+        for group in groups.values():
+            group['mean'] = group['total'] / group['count']
+        return sorted(groups.values(), key=lambda group: group['total'], reverse=True)
+
+    def write_json(self, path):
+        """Write all finished spans and the summary to a JSON file."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as trace_file:
+            json.dump({'spans': [span.to_dict() for span in self.spans()], 'summary': self.summary()},
+                      trace_file, indent=2, ensure_ascii=False)
+        return path
+
+
+tracer = Tracer()
+
+
+def start_run_span(name="run", **attributes):
+    """
+    Open a root span lasting until the process exits, so all phases of a CLI run share one trace and one
+    sampling decision. Call it after registering other exit handlers that read or export spans: atexit runs
+    the handlers in reverse order, so the span is closed before them.
+    """
+    span = tracer.span(name, kind='run', **attributes)
+    span.__enter__()
+    atexit.register(span.__exit__, None, None, None)
+
+
+def token_usage(result):
+    """(prompt tokens, completion tokens) of an LLMResult/ChatResult, from llm_output['token_usage'] if present."""
+    llm_output = getattr(result, 'llm_output', None) or {}
+    usage = llm_output.get('token_usage') or llm_output.get('usage') or {}
+    if not usage:                                                       # Ollama reports counts per generation
+        generations = getattr(result, 'generations', None) or []
+        first = generations[0] if generations else None
+        if isinstance(first, list):
+            first = first[0] if first else None
+        info = getattr(first, 'generation_info', None) or {}
+        usage = {'prompt_tokens': info.get('prompt_eval_count'), 'completion_tokens': info.get('eval_count')}
+    if not isinstance(usage, dict):
+        usage = getattr(usage, '__dict__', {})
+    prompt = usage.get('prompt_tokens', usage.get('input_tokens'))
+    completion = usage.get('completion_tokens', usage.get('output_tokens'))
+    return prompt or 0, completion or 0
+
+
+# Class -> its traced subclass, created once per class
+_traced_classes = {}
+_traced_lock = threading.Lock()
+
+
+def _traced_subclass(cls, method_name, make_method):
+    """Subclass of cls whose method_name is wrapped by make_method(original), keeping the original signature."""
+    with _traced_lock:
+        traced = _traced_classes.get((cls, method_name))
+        if traced is None:
+            original = getattr(cls, method_name)
+            namespace = {'__module__': cls.__module__, '__traced__': True,
+                         method_name: functools.wraps(original)(make_method(original))}
+            traced = type(f"Traced{cls.__name__}", (cls,), namespace)
+            _traced_classes[(cls, method_name)] = traced
+        return traced
+
+
+def _traced_tool_run(original):
+    def _run(self, *args, **kwargs):
+        with tracer.span(f"tool {self.name}", kind='tool', tool=self.name):
+            return original(self, *args, **kwargs)
+    return _run
+
+
+def _traced_task_execute(original):
+    def execute(self, *args, **kwargs):
+        role = self.agent.role if self.agent is not None else None
+        with tracer.span(f"task {self.__dict__.get('_trace_name') or self.description[:40]}", kind='task', agent=role):
+            return original(self, *args, **kwargs)
+    return execute
+
+
+def instrument_tool(tool):
+    """Record a span for every _run of a tool (langchain or crewai tool), by switching it to a traced subclass."""
+    if not tracer.enabled or not hasattr(tool, '_run') or getattr(type(tool), '__traced__', False):
+        return tool
+    try:
+        object.__setattr__(tool, '__class__', _traced_subclass(type(tool), '_run', _traced_tool_run))
+    except Exception as e:
+        logger.debug(f"Tool {tool!r} can't be instrumented: {e}")
+    return tool
+
+
+def instrument_task(task, name=None):
+    """Record a span for the execution of a crewai Task, named after its sheet Task Name."""
+    if not tracer.enabled or getattr(type(task), '__traced__', False):
+        return task
+    try:
+        object.__setattr__(task, '__class__', _traced_subclass(type(task), 'execute', _traced_task_execute))
+        if name:
+            task.__dict__['_trace_name'] = name
+    except Exception as e:
+        logger.debug(f"Task can't be instrumented: {e}")
+    return task
+
+
+def default_trace_path():
+    return os.path.join(InstrumentationConfig.trace_dir, f"trace-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.json")
+
+
+def summary_table(limit=None):
+    """Rich table of tracer.summary(), slowest phases first."""
+    from rich.table import Table
+
+    table = Table(title="Where the time went", show_header=True, header_style="bold magenta")
+    for column in ("Kind", "Name"):
+        table.add_column(column)
+    for column in ("Calls", "Total s", "Mean s", "Max s", "Errors", "Prompt tok", "Completion tok"):
+        table.add_column(column, justify="right")
+    for group in tracer.summary()[:limit]:
+        table.add_row(group['kind'], group['name'], str(group['count']), f"{group['total']:.2f}",
+                      f"{group['mean']:.2f}", f"{group['max']:.2f}", str(group['errors']),
+                      str(group['prompt_tokens']), str(group['completion_tokens']))
+    return table
@@ -0,0 +1,119 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import SchedulerConfig
+from     concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from     collections import OrderedDict
+import   threading
+import   time
+import   uuid
+
+
+class QueueFull(Exception):
+    """Raised by JobScheduler.submit when every worker is busy and the queue is at its limit."""
+
+
+class Job:
+    """One crew run request and, once finished, its result or error."""
+    def __init__(self, assignment=None, resume=False):
+        self.id = uuid.uuid4().hex
+        self.assignment = assignment
+        self.resume = resume
+        self.future = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def status(self):
+        if self.future is None or not (self.future.running() or self.future.done()):
+            return 'queued'
+        if not self.future.done():
+            return 'running'
+        if self.future.cancelled():
+            return 'cancelled'
+        return 'failed' if self.future.exception() is not None else 'done'
+
+    def to_dict(self):
+        record = {
+            'id':           self.id,
+            'assignment':   self.assignment,
+            'status':       self.status,
+            'submitted_at': self.submitted_at,
+            'finished_at':  self.finished_at,
+        }
+        if record['status'] == 'done':
+            record['result'] = self.future.result()
+        elif record['status'] == 'failed':
+            record['error'] = str(self.future.exception())
+        return record
+
+
+class JobScheduler:
+    """
+    Runs crew jobs on a pool of worker threads or processes.
+    At most workers + max_queued jobs are accepted at a time; beyond that submit waits (block=True)
+    or raises QueueFull, so callers get backpressure instead of an unbounded backlog.
+    run(assignment, resume) is called for each job; with processes it must be a module-level function,
+    and initializer(*initargs) sets up each worker process once (e.g. loads the sheet).
+    Finished jobs are kept for status queries, the oldest beyond keep_finished are dropped.
+    """
+    def __init__(self, run, workers=None, max_queued=None, executor=None, initializer=None, initargs=(),
+                 keep_finished=None):
+        self.run = run
+        self.workers = workers or SchedulerConfig.workers
+        self.max_queued = SchedulerConfig.max_queued if max_queued is None else max_queued
+        self.keep_finished = keep_finished or SchedulerConfig.keep_finished
+        self.kind = executor or SchedulerConfig.executor
+        if self.kind == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initializer, initargs=initargs)
+        elif self.kind == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crew-job",
+                                               initializer=initializer, initargs=initargs)
+        else:
+            raise ValueError(f"Unknown executor '{self.kind}', expected 'thread' or 'process'.")
+        self.slots = threading.BoundedSemaphore(self.workers + self.max_queued)
+        self.jobs = OrderedDict()                                       # id -> Job, in submission order
+        self.lock = threading.Lock()
+
+    def submit(self, assignment=None, resume=False, block=False, timeout=None):
+        """Queue a job and return it. Raises QueueFull if no slot frees up (immediately unless block)."""
+        if not self.slots.acquire(blocking=block, timeout=timeout if block else None):
+            raise QueueFull(f"{self.workers} jobs running and {self.max_queued} queued. Try again later.")
+        job = Job(assignment, resume)
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            job.future = self.executor.submit(self.run, assignment, resume)
+        except Exception:
+            with self.lock:
+                del self.jobs[job.id]
+            self.slots.release()
+            raise
+        job.future.add_done_callback(lambda future, job=job: self._finished(job))
+        return job
+
+    def _finished(self, job):
+        job.finished_at = time.time()
+        self.slots.release()
+        if not job.future.cancelled() and job.future.exception() is not None:
+            logger.error(f"Job {job.id} failed: {job.future.exception()}")
+        with self.lock:
+            finished = [id_ for id_, j in self.jobs.items() if j.finished_at is not None]
+            for id_ in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self.jobs[id_]
+
+    def get(self, job_id):
+        """The job with this id, or None if unknown or already dropped."""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def stats(self):
+        statuses = [job.status for job in self.list()]
+        return {'executor': self.kind, 'workers': self.workers, 'max_queued': self.max_queued,
+                **{status: statuses.count(status) for status in ('queued', 'running', 'done', 'failed')}}
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
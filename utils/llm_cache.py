@@ -0,0 +1,143 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import LLMCacheConfig
+from     collections import OrderedDict
+from     contextlib import contextmanager
+import   hashlib
+import   json
+import   os
+import   sqlite3
+import   threading
+import   time
+
+
+class LLMResponseCache:
+    """
+    Cache of LLM results keyed by (provider, model, temperature, messages, stop, call options).
+    Results are kept serialized (langchain_core.load) in a small in-memory LRU in front of a SQLite file.
+    Entries expire after ttl seconds; the file keeps at most max_entries, least recently used are evicted.
+    """
+    def __init__(self, path=None, ttl=None, max_entries=None, memory_entries=None):
+        self.path = path or LLMCacheConfig.path
+        self.ttl = LLMCacheConfig.ttl if ttl is None else ttl
+        self.max_entries = max_entries or LLMCacheConfig.max_entries
+        self.memory_entries = memory_entries or LLMCacheConfig.memory_entries
+        self.memory = OrderedDict()                                     # key -> (created_at, serialized result)
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS responses "
+                       "(key TEXT PRIMARY KEY, value TEXT, created_at REAL, accessed_at REAL)")
+
+    @contextmanager
+    def _connect(self):
+        """Connection for one transaction: committed, or rolled back on error, then closed."""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def make_key(provider, model, temperature, payload, stop=None, options=None):
+        """Stable hash of everything that determines the answer of a call."""
+        from langchain_core.load import dumps
+        text = dumps([str(provider).lower(), model, temperature, payload, stop, options or {}], sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _expired(self, created_at):
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def get(self, key):
+        """Return the cached result for key, or None."""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self.memory.move_to_end(key)
+                    return _deserialize(entry[1])
+                del self.memory[key]
+        with self._connect() as db:
+            row = db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1]):
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._remember(key, row[1], row[0])
+        return _deserialize(row[0])
+
+    def put(self, key, result):
+        value, now = _serialize(result), time.time()
+        self._remember(key, now, value)
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                       (key, value, now, now))
+            count = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                db.execute("DELETE FROM responses WHERE key IN "
+                           "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)", (count - self.max_entries,))
+
+    def _remember(self, key, created_at, value):
+        with self.lock:
+            self.memory[key] = (created_at, value)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+        with self._connect() as db:
+            db.execute("DELETE FROM responses")
+
+
+def _serialize(result):
+    from langchain_core.load import dumps
+    return dumps({'type': type(result).__name__, 'generations': result.generations, 'llm_output': result.llm_output})
+
+
+def _deserialize(value):
+    from langchain_core.load import loads
+    from langchain_core.outputs import ChatResult, LLMResult
+    data = loads(value)
+    result_class = ChatResult if data['type'] == 'ChatResult' else LLMResult
+    return result_class(generations=data['generations'], llm_output=data['llm_output'])
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """The process-wide response cache, or None if LLMCacheConfig.enabled is off."""
+    global _cache
+    if not LLMCacheConfig.enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
+
+
+def cache_key_for(llm, provider, model, args, kwargs):
+    """
+    Cache key of a _generate call, or None if the call must not be cached:
+    sampling with temperature > 0 gives a different answer each time, unless LLMCacheConfig allows caching it.
+    An unset temperature counts as non-zero: the provider's default samples.
+    """
+    temperature = getattr(llm, 'temperature', None)
+    if (temperature is None or temperature > 0) and not LLMCacheConfig.allow_nonzero_temperature:
+        return None
+    kwargs = dict(kwargs)
+    kwargs.pop('run_manager', None)
+    payload = args[0] if args else kwargs.pop('messages', kwargs.pop('prompts', None))
+    stop = args[1] if len(args) > 1 else kwargs.pop('stop', None)
+    try:
+        options = json.loads(json.dumps(kwargs, sort_keys=True, default=str))
+        return LLMResponseCache.make_key(provider, model, temperature, payload, stop, options)
+    except Exception as e:
+        logger.debug(f"Call can't be cached: {e}")
+        return None
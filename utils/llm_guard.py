@@ -0,0 +1,368 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import LLMGuardConfig, LLMCacheConfig, InstrumentationConfig
+from     utils.llm_cache import get_response_cache, cache_key_for
+from     utils.rate_limiter import RateLimitCoordinator, parse_retry_after
+from     utils.tokenizers import get_encoder, count_tokens
+from     utils.instrumentation import tracer, token_usage
+from     typing import Any
+import   asyncio
+import   contextvars
+import   random
+import   threading
+import   time
+
+
+_inside_guard = contextvars.ContextVar('inside_llm_guard', default=False)
+_END = object()
+
+
+def _status_code(error):
+    """HTTP status of a provider error (openai, anthropic, groq, httpx or requests style), or None."""
+    code = getattr(error, 'status_code', None)
+    if code is None:
+        code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return code if isinstance(code, int) else None
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    return parse_retry_after(headers.get('retry-after')) if headers is not None else None
+
+
+def is_retryable(error):
+    """Rate limited (429) or server side (5xx) errors are worth retrying."""
+    code = _status_code(error)
+    return code is not None and (code == 429 or 500 <= code < 600)
+
+
+class LLMGuard:
+    """
+    Request-level limits for one model configuration, shared by all LLM instances using it:
+    requests and tokens per minute (buckets from the RateLimitCoordinator), a cap on requests in flight,
+    and retries with jittered exponential backoff on 429 and 5xx responses.
+    A request is guarded once: calls made while running it (e.g. _generate streaming through _stream)
+    go straight through. Its token estimate is charged on the first attempt only.
+    """
+    def __init__(self, provider, model, rpm=None, tpm=None, max_in_flight=None, max_retries=None, api_key=None):
+        coordinator = RateLimitCoordinator()
+        self.provider = provider
+        self.model = model
+        self.requests = coordinator.get_bucket(provider, model, rpm, api_key, kind='requests') if rpm else None
+        self.tokens = coordinator.get_bucket(provider, model, tpm, api_key, kind='tokens') if tpm else None
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.max_retries = LLMGuardConfig.max_retries if max_retries is None else max_retries
+
+    def estimate_tokens(self, payload, max_tokens=None):
+        """Tokens a request will use: its messages or prompts, plus max_tokens for the answer if known."""
+        if self.tokens is None:
+            return 0
+        enc = get_encoder()
+        count = sum(count_tokens(enc, getattr(item, 'content', item)) for item in payload or [])
+        return count * 1.1 + (max_tokens if isinstance(max_tokens, int) else 0)  #10% safety margin
+
+    def backoff(self, attempt, error=None):
+        """Seconds to wait before retry number attempt: Retry-After if the provider sent one, else jittered exponential."""
+        retry_after = _retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, LLMGuardConfig.backoff_max)
+        delay = min(LLMGuardConfig.backoff_max, LLMGuardConfig.backoff_base * 2 ** attempt)
+        return random.uniform(delay / 2, delay)                         # Jitter spreads out retries of parallel agents
+
+    def _should_retry(self, error, attempt):
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        if _status_code(error) == 429 and self.requests is not None:
+            self.requests.penalize(_retry_after(error) or 0)
+        return True
+
+    def _acquire(self, tokens):
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            self.tokens.acquire(tokens)
+        if self.in_flight is not None:
+            self.in_flight.acquire()
+
+    async def _acquire_async(self, tokens):
+        if self.requests is not None:
+            await self.requests.acquire_async(1)
+        if self.tokens is not None and tokens:
+            await self.tokens.acquire_async(tokens)
+        if self.in_flight is not None:
+            while not self.in_flight.acquire(blocking=False):           # Don't block the event loop
+                await asyncio.sleep(0.05)
+
+    def _release(self):
+        if self.in_flight is not None:
+            self.in_flight.release()
+
+    def call(self, fn, tokens=0):
+        """Run fn() within the limits, retrying on 429 and 5xx."""
+        if _inside_guard.get():
+            return fn()
+        attempt = 0
+        while True:
+            self._acquire(tokens if attempt == 0 else 0)
+            inside = _inside_guard.set(True)
+            try:
+                return fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                error, delay = e, self.backoff(attempt, e)
+            finally:
+                _inside_guard.reset(inside)
+                self._release()
+            attempt += 1
+            logger.warning(f"{self.provider} model '{self.model}' failed ({error}). Retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+            time.sleep(delay)
+
+    async def acall(self, fn, tokens=0):
+        """Async version of call(); fn() returns an awaitable."""
+        if _inside_guard.get():
+            return await fn()
+        attempt = 0
+        while True:
+            await self._acquire_async(tokens if attempt == 0 else 0)
+            inside = _inside_guard.set(True)
+            try:
+                return await fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                error, delay = e, self.backoff(attempt, e)
+            finally:
+                _inside_guard.reset(inside)
+                self._release()
+            attempt += 1
+            logger.warning(f"{self.provider} model '{self.model}' failed ({error}). Retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+
+    def stream(self, fn, tokens=0):
+        """Iterate over fn() within the limits. Only retried if the error comes before the first chunk."""
+        if _inside_guard.get():
+            yield from fn()
+            return
+        attempt = 0
+        while True:
+            self._acquire(tokens if attempt == 0 else 0)
+            started = False
+            try:
+                chunks = iter(fn())
+                while True:
+                    inside = _inside_guard.set(True)                    # Only while producing a chunk, not while the caller holds it
+                    try:
+                        chunk = next(chunks, _END)
+                    finally:
+                        _inside_guard.reset(inside)
+                    if chunk is _END:
+                        return
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+                error, delay = e, self.backoff(attempt, e)
+            finally:
+                self._release()
+            attempt += 1
+            logger.warning(f"{self.provider} model '{self.model}' failed ({error}). Retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+            time.sleep(delay)
+
+    async def astream(self, fn, tokens=0):
+        """Async version of stream(); fn() returns an async iterator."""
+        if _inside_guard.get():
+            async for chunk in fn():
+                yield chunk
+            return
+        attempt = 0
+        while True:
+            await self._acquire_async(tokens if attempt == 0 else 0)
+            started = False
+            try:
+                chunks = fn().__aiter__()
+                while True:
+                    inside = _inside_guard.set(True)
+                    try:
+                        chunk = await anext(chunks, _END)
+                    finally:
+                        _inside_guard.reset(inside)
+                    if chunk is _END:
+                        return
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+                error, delay = e, self.backoff(attempt, e)
+            finally:
+                self._release()
+            attempt += 1
+            logger.warning(f"{self.provider} model '{self.model}' failed ({error}). Retry {attempt}/{self.max_retries} in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+
+
+class GuardedLLMMixin:
+    """
+    Runs _generate, _agenerate, _stream and _astream of a langchain LLM or chat model through self.llm_guard.
+    The first positional argument is the messages (chat models) or prompts (LLMs) of the request.
+    With the response cache enabled, _generate and _agenerate are answered from it when possible;
+    llm_scope is the (provider, model) the cache keys use. With instrumentation on, both record a span per call.
+    """
+    def _guard_tokens(self, args, kwargs):
+        if _inside_guard.get():
+            return 0                                                    # Not charged again, skip counting
+        payload = args[0] if args else kwargs.get('messages', kwargs.get('prompts'))
+        return self.llm_guard.estimate_tokens(payload, getattr(self, 'max_tokens', None))
+
+    def _cached(self, args, kwargs):
+        """(cache, key, cached result) for a call; key is None if the response cache doesn't apply."""
+        cache = get_response_cache()
+        if cache is None or self.llm_scope is None:
+            return None, None, None
+        try:
+            key = cache_key_for(self, *self.llm_scope, args, kwargs)
+            return cache, key, cache.get(key) if key else None
+        except Exception as e:
+            logger.error(f"LLM response cache lookup failed: {e}")
+            return None, None, None
+
+    @staticmethod
+    def _store(cache, key, result):
+        try:
+            cache.put(key, result)
+        except Exception as e:
+            logger.error(f"Failed to store LLM response in cache: {e}")
+
+    def _span(self):
+        provider, model = self.llm_scope or (None, None)
+        return tracer.span(f"llm {provider}/{model}", kind='llm', provider=provider, model=model)
+
+    @staticmethod
+    def _record(span, result, cached=False):
+        if span is not None:
+            span.set(cached=cached)
+            span.add_tokens(*token_usage(result))
+
+    def _generate(self, *args, **kwargs):
+        with self._span() as span:
+            cache, key, cached = self._cached(args, kwargs)
+            if cached is not None:
+                logger.info(f"Using cached response of model '{self.llm_scope[1]}'.")
+                self._record(span, cached, cached=True)
+                return cached
+            if self.llm_guard is None:
+                result = super(GuardedLLMMixin, self)._generate(*args, **kwargs)
+            else:
+                result = self.llm_guard.call(lambda: super(GuardedLLMMixin, self)._generate(*args, **kwargs),
+                                             self._guard_tokens(args, kwargs))
+            self._record(span, result)
+            if key is not None:
+                self._store(cache, key, result)
+            return result
+
+    async def _agenerate(self, *args, **kwargs):
+        with self._span() as span:
+            cache, key, cached = self._cached(args, kwargs)
+            if cached is not None:
+                logger.info(f"Using cached response of model '{self.llm_scope[1]}'.")
+                self._record(span, cached, cached=True)
+                return cached
+            if self.llm_guard is None:
+                result = await super(GuardedLLMMixin, self)._agenerate(*args, **kwargs)
+            else:
+                result = await self.llm_guard.acall(lambda: super(GuardedLLMMixin, self)._agenerate(*args, **kwargs),
+                                                    self._guard_tokens(args, kwargs))
+            self._record(span, result)
+            if key is not None:
+                self._store(cache, key, result)
+            return result
+
+    def _stream(self, *args, **kwargs):
+        if self.llm_guard is None:
+            yield from super(GuardedLLMMixin, self)._stream(*args, **kwargs)
+            return
+        yield from self.llm_guard.stream(lambda: super(GuardedLLMMixin, self)._stream(*args, **kwargs),
+                                         self._guard_tokens(args, kwargs))
+
+    async def _astream(self, *args, **kwargs):
+        if self.llm_guard is None:
+            async for chunk in super(GuardedLLMMixin, self)._astream(*args, **kwargs):
+                yield chunk
+            return
+        async for chunk in self.llm_guard.astream(lambda: super(GuardedLLMMixin, self)._astream(*args, **kwargs),
+                                                  self._guard_tokens(args, kwargs)):
+            yield chunk
+
+
+# LLM class -> its guarded subclass, created once per class
+_guarded_classes = {}
+_guards = {}
+_lock = threading.Lock()
+
+
+def _langchain_default(cls, name):
+    """True if cls inherits method name from langchain_core's base classes instead of implementing it."""
+    return getattr(getattr(cls, name, None), '__module__', '').startswith('langchain_core.language_models')
+
+
+def guarded_class(cls):
+    """Subclass of cls with GuardedLLMMixin and an llm_guard field, e.g. RateLimitedChatOpenAI."""
+    with _lock:
+        guarded = _guarded_classes.get(cls)
+        if guarded is None:
+            namespace = {'__annotations__': {'llm_guard': Any, 'llm_scope': Any},
+                         'llm_guard': None, 'llm_scope': None, '__module__': __name__}
+            # langchain's defaults run _generate/_stream in an executor or tell that streaming isn't supported:
+            # keep them, so requests aren't guarded twice and streaming detection still works
+            for name in ('_agenerate', '_stream', '_astream'):
+                if _langchain_default(cls, name):
+                    namespace[name] = getattr(cls, name)
+            guarded = type(f"RateLimited{cls.__name__}", (GuardedLLMMixin, cls), namespace)
+            _guarded_classes[cls] = guarded
+        return guarded
+
+
+def _api_key(llm):
+    for attribute in ('openai_api_key', 'anthropic_api_key', 'groq_api_key', 'huggingfacehub_api_token'):
+        value = getattr(llm, attribute, None)
+        if value is not None:
+            return value.get_secret_value() if hasattr(value, 'get_secret_value') else str(value)
+    return None
+
+
+def get_guard(provider, model, rpm=None, tpm=None, max_in_flight=None, max_retries=None, api_key=None):
+    """Shared LLMGuard for a model configuration, so its in-flight cap holds across agents."""
+    key = (str(provider).lower(), model, rpm, tpm, max_in_flight, max_retries, api_key)
+    with _lock:
+        guard = _guards.get(key)
+        if guard is None:
+            guard = LLMGuard(provider, model, rpm, tpm, max_in_flight, max_retries, api_key)
+            _guards[key] = guard
+        return guard
+
+
+def guard_llm(llm, provider, model, rpm=None, tpm=None, max_in_flight=None, max_retries=None):
+    """
+    Return llm with request-level limits and retries, the response cache and call spans if enabled:
+    a shallow copy switched to its guarded subclass.
+    Groq clients keep their own header-driven TPM throttle, so only the other limits apply to them.
+    """
+    if llm is None or isinstance(llm, GuardedLLMMixin) or \
+            not (LLMGuardConfig.enabled or LLMCacheConfig.enabled or InstrumentationConfig.enabled):
+        return llm
+    if str(provider).lower() == 'groq':
+        tpm = None
+    try:
+        guard = None
+        if LLMGuardConfig.enabled:
+            guard = get_guard(provider, model, rpm, tpm, max_in_flight, max_retries, _api_key(llm))
+        guarded = llm.copy()
+        object.__setattr__(guarded, '__class__', guarded_class(type(llm)))
+        object.__setattr__(guarded, 'llm_guard', guard)
+        object.__setattr__(guarded, 'llm_scope', (provider, model))
+        return guarded
+    except Exception as e:
+        logger.error(f"Failed to apply rate limits to {provider} model '{model}': {e}")
+        return llm
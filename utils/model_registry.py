@@ -0,0 +1,90 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     dataclasses import dataclass
+from     typing import Optional
+import   pandas as pd
+
+
+@dataclass(frozen=True)
+class ModelRecord:
+    """One row of the Models sheet."""
+    name:       str
+    provider:   Optional[str] = None
+    base_url:   Optional[str] = None
+    deployment: Optional[str] = None
+    num_ctx:    Optional[int] = None
+    rpm:        Optional[int] = None                                    # Requests per minute
+    tpm:        Optional[int] = None                                    # Tokens per minute
+    max_in_flight: Optional[int] = None
+    max_retries:   Optional[int] = None
+
+    def llm_kwargs(self):
+        """Keyword arguments for get_llm, besides model_name and temperature."""
+        return {
+            'num_ctx':       self.num_ctx,
+            'provider':      self.provider,
+            'base_url':      self.base_url,
+            'deployment':    self.deployment,
+            'rpm':           self.rpm,
+            'tpm':           self.tpm,
+            'max_in_flight': self.max_in_flight,
+            'max_retries':   self.max_retries,
+        }
+
+
+def _value(row, column, cast=str):
+    """Cell value or None if the column is missing or the cell is empty."""
+    value = row.get(column)
+    if value is None or pd.isna(value):
+        return None
+    return cast(value)
+
+
+class ModelRegistry:
+    """
+    Models sheet indexed by model name. Built once per run; lookups strip surrounding whitespace,
+    and the first row wins if a model is listed twice, like the DataFrame filters it replaces.
+    """
+    # Models sheet column -> ModelRecord attribute
+    columns = {
+        'Provider':                  'provider',
+        'base_url':                  'base_url',
+        'Deployment':                'deployment',
+        'Context size (local only)': 'num_ctx',
+        'RPM':                       'rpm',
+        'TPM':                       'tpm',
+        'Max in-flight':             'max_in_flight',
+        'Max retries':               'max_retries',
+    }
+
+    def __init__(self, models_df):
+        self.models = {}
+        for row in models_df.to_dict('records'):
+            name = _value(row, 'Model')
+            if name is None or name.strip() in self.models:
+                continue
+            name = name.strip()
+            self.models[name] = ModelRecord(
+                name       = name,
+                provider   = _value(row, 'Provider'),
+                base_url   = _value(row, 'base_url'),
+                deployment = _value(row, 'Deployment'),
+                num_ctx    = _value(row, 'Context size (local only)', int),
+                rpm        = _value(row, 'RPM', int),
+                tpm        = _value(row, 'TPM', int),
+                max_in_flight = _value(row, 'Max in-flight', int),
+                max_retries   = _value(row, 'Max retries', int),
+            )
+        logger.info(f"Loaded {len(self.models)} models from the Models sheet.")
+
+    def get(self, name):
+        """Return the ModelRecord for a model name, or None if it isn't in the Models sheet."""
+        if not isinstance(name, str):
+            return None
+        return self.models.get(name.strip())
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __len__(self):
+        return len(self.models)
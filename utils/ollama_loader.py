@@ -1,5 +1,6 @@
 import   logging
 import   socket
+import   threading
 from     langchain_community.llms.ollama import Ollama
 from     rich.progress import Progress
 from     ollama import list, pull, Client
@@ -16,6 +17,27 @@ def running_in_docker():
             # The name is not known, which likely means not running inside Docker
             return False
     
+# Ollama host -> names of local models. Listed once per run and shared by all agents.
+_model_names = {}
+_model_locks = {}
+_lock = threading.Lock()
+_pull_lock = threading.Lock()                                           # One download (and progress bar) at a time
+
+def _model_lock(host, model_name):
+    """Lock for one model on one host, so parallel agents don't list or pull the same model twice."""
+    with _lock:
+        return _model_locks.setdefault((host, model_name), threading.Lock())
+
+def _local_model_names(ollama_client, host):
+    with _lock:
+        names = _model_names.get(host)
+    if names is None:
+        model_list = list()['models'] if ollama_client is None else ollama_client.list()['models']
+        names = {model['name'] for model in model_list}
+        with _lock:
+            names = _model_names.setdefault(host, names)
+    return names
+
 class OllamaLoader:
     
     
@@ -50,22 +72,28 @@ class OllamaLoader:
             print (f"Ollama models usually have a version, like {model_name}:instruct, or {model_name}:latest. That's ok, I'll take a guess and use the latest version.")
 
         
-        model_list = list()['models'] if ollama_client is None else ollama_client.list()['models']
-        
-        for model in model_list:
-            if model['name'] == model_name:
+        with _model_lock(base_url, model_name):
+            if model_name not in _local_model_names(ollama_client, base_url):
+                OllamaLoader.pull(model_name, ollama_client)
+                with _lock:
+                    _model_names[base_url].add(model_name)
+            else:
                 logger.info(f"Model '{model_name}' found in Ollama, loading directly.")
-                
-                if base_url is not None:
-                    return Ollama(model=model_name, temperature=temperature, num_ctx=num_ctx, base_url=base_url)
-                else:
-                    return Ollama(model=model_name, temperature=temperature, num_ctx=num_ctx)
         
+        if base_url is not None:
+            return Ollama(model=model_name, temperature=temperature, num_ctx=num_ctx, base_url=base_url)
+        else:
+            return Ollama(model=model_name, temperature=temperature, num_ctx=num_ctx)
+
+    def pull(model_name, ollama_client=None):
+        """
+        Pulls a model from the Ollama library, showing download progress.
+        """
         logger.info(f"No local matching model found for '{model_name}' in Ollama.")
         print(f"I'm trying to download '{model_name}' from Ollama... This may take a while. Why not grab a cup of coffee...")
         
         progress = Progress(expand=True, transient=True)
-        with progress:
+        with _pull_lock, progress:
             llm_task = progress.add_task(f"Downloading '{model_name}'", total=1000)
             if ollama_client is None:
                 for response in pull(model=model_name, stream=True):
@@ -77,10 +105,6 @@ class OllamaLoader:
         logger.info(f"Model '{model_name}' successfully pulled")
         logger.info(f"Attempting to load model '{model_name}'...")
         print(f"Model '{model_name}' successfully pulled. Now I'm trying to load it...")
-        if base_url is not None:
-            return Ollama(model=model_name, temperature=temperature, num_ctx=num_ctx, base_url=base_url)
-        else:
-            return Ollama(model=model_name, temperature=temperature, num_ctx=num_ctx)
         
           
     
@@ -0,0 +1,335 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import RateLimitConfig
+from     email.utils import parsedate_to_datetime
+import   asyncio
+import   hashlib
+import   os
+import   re
+import   sqlite3
+import   threading
+import   time
+
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+def parse_duration(value):
+    """
+    Seconds from a rate-limit duration header such as '2m59.56s', '7.66s', '500ms' or a plain number of seconds.
+    Returns None if the value can't be parsed.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts or ''.join(number + unit for number, unit in parts) != value:
+        return None
+    factors = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+    return sum(float(number) * factors[unit] for number, unit in parts)
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header: delay seconds or an HTTP date. Returns None if it can't be parsed."""
+    seconds = parse_duration(value)
+    if seconds is not None or value is None:
+        return seconds
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket for per-minute limits such as Groq's tokens per minute.
+
+    The bucket holds at most capacity tokens (default: one minute worth) and refills continuously at
+    rate_per_minute / 60 tokens per second, measured on a monotonic clock. Waiters are served first come,
+    first served: a large request at the head of the queue is not starved by smaller ones behind it.
+    A request larger than the capacity waits for a full bucket and then leaves it in debt.
+    """
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0                                  # Tokens per second
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated_at = clock()
+        self._condition = threading.Condition()
+        self._next_ticket = 0                                               # FIFO queue of waiters as tickets
+        self._now_serving = 0
+        self._abandoned = set()                                             # Tickets of waiters that gave up
+
+    def _refill(self):
+        """Add the tokens accumulated since the last update. Caller holds the lock."""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _delay(self, tokens):
+        """Seconds until tokens are available. Caller holds the lock."""
+        needed = min(tokens, self.capacity)
+        if self.tokens >= needed or self.rate <= 0:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def _leave(self, ticket):
+        """Remove a ticket from the queue and wake the next waiter. Caller holds the lock."""
+        if ticket != self._now_serving:
+            self._abandoned.add(ticket)                                     # Interrupted while queued
+            return
+        self._now_serving += 1
+        while self._now_serving in self._abandoned:
+            self._abandoned.discard(self._now_serving)
+            self._now_serving += 1
+        self._condition.notify_all()
+
+    def acquire(self, tokens):
+        """Block until tokens are available and take them. Returns the seconds spent waiting."""
+        started = self.clock()
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            try:
+                while True:
+                    self._refill()
+                    if ticket == self._now_serving:
+                        delay = self._delay(tokens)
+                        if delay <= 0:
+                            self.tokens -= tokens
+                            break
+                        logger.debug(f"Waiting {delay:.2f}s for {tokens} tokens ({self.tokens:.0f} available).")
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()                              # Not our turn yet
+            finally:
+                self._leave(ticket)
+        return self.clock() - started
+
+    async def acquire_async(self, tokens):
+        """
+        Asynchronous acquire: suspends only the calling coroutine, never the event loop.
+        The lock is held just long enough to check and take tokens. Threads queued in acquire() go first.
+        Returns the seconds spent waiting.
+        """
+        started = self.clock()
+        while True:
+            with self._condition:
+                self._refill()
+                if self._next_ticket == self._now_serving:                  # No thread waiting in acquire()
+                    delay = self._delay(tokens)
+                    if delay <= 0:
+                        self.tokens -= tokens
+                        return self.clock() - started
+                else:
+                    delay = 0.05
+            await asyncio.sleep(max(delay, 0.01))
+
+    def try_acquire(self, tokens):
+        """Take tokens if they are available now and nobody is queued. Returns True on success."""
+        with self._condition:
+            self._refill()
+            if self._next_ticket != self._now_serving or self._delay(tokens) > 0:
+                return False
+            self.tokens -= tokens
+            return True
+
+    def delay(self, tokens):
+        """Seconds until tokens would be available, ignoring queued waiters."""
+        with self._condition:
+            self._refill()
+            return self._delay(tokens)
+
+    def release(self, tokens):
+        """Return tokens that were reserved but not used, e.g. the unused part of max_tokens."""
+        with self._condition:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + tokens)
+            self._condition.notify_all()
+
+    def observe(self, remaining=None, limit=None, reset_after=None):
+        """
+        Adapt the bucket to the budget reported by the provider: limit becomes the capacity,
+        remaining the current tokens, and the time until the budget is full again sets the refill rate.
+        """
+        with self._condition:
+            self._refill()
+            self.capacity, self.rate, self.tokens = _observed(self.capacity, self.rate, self.tokens,
+                                                              remaining, limit, reset_after)
+            self._condition.notify_all()
+
+    def penalize(self, retry_after):
+        """Make the next acquire wait at least retry_after seconds, e.g. after a 429 response."""
+        with self._condition:
+            self._refill()
+            self.tokens = min(self.tokens, -retry_after * self.rate)
+
+    @property
+    def remaining(self):
+        with self._condition:
+            self._refill()
+            return self.tokens
+
+    @remaining.setter
+    def remaining(self, tokens):
+        with self._condition:
+            self._refill()
+            self.tokens = min(self.capacity, float(tokens))
+            self._condition.notify_all()
+
+
+class SqliteTokenBucket:
+    """
+    Token bucket kept in a SQLite database, shared by all processes on a host that use the same file.
+    Every update runs in a BEGIN IMMEDIATE transaction, so concurrent processes see a consistent budget.
+    Refill uses the wall clock, the only clock processes share. Same interface as TokenBucket, except that
+    waiters poll instead of queueing, so there's no FIFO ordering across processes.
+    """
+    def __init__(self, path, key, rate_per_minute, capacity=None, poll_interval=0.05):
+        self.path = path
+        self.key = key
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.poll_interval = poll_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+
+    def _transaction(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)   # Short-lived connection, safe across threads
+        return _Transaction(db)
+
+    def _update(self, change):
+        """Refill, apply change(tokens) -> (new_tokens, result) in one transaction and return result."""
+        with self._transaction() as db:
+            now = time.time()
+            row = db.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (self.key,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            tokens, result = change(tokens)
+            db.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (self.key, tokens, now))
+            return result
+
+    def _delay(self, available, tokens):
+        needed = min(tokens, self.capacity)
+        if available >= needed or self.rate <= 0:
+            return 0.0
+        return (needed - available) / self.rate
+
+    def _take(self, tokens):
+        """Take tokens if available. Returns 0 on success, otherwise the seconds to wait before retrying."""
+        def change(available):
+            delay = self._delay(available, tokens)
+            return (available - tokens, 0.0) if delay <= 0 else (available, delay)
+        return self._update(change)
+
+    def acquire(self, tokens):
+        started = time.monotonic()
+        while (delay := self._take(tokens)) > 0:
+            time.sleep(max(delay, self.poll_interval))
+        return time.monotonic() - started
+
+    async def acquire_async(self, tokens):
+        started = time.monotonic()
+        while (delay := self._take(tokens)) > 0:
+            await asyncio.sleep(max(delay, self.poll_interval))
+        return time.monotonic() - started
+
+    def try_acquire(self, tokens):
+        return self._take(tokens) <= 0
+
+    def delay(self, tokens):
+        return self._update(lambda available: (available, self._delay(available, tokens)))
+
+    def release(self, tokens):
+        self._update(lambda available: (min(self.capacity, available + tokens), None))
+
+    def observe(self, remaining=None, limit=None, reset_after=None):
+        def change(available):
+            self.capacity, self.rate, available = _observed(self.capacity, self.rate, available,
+                                                            remaining, limit, reset_after)
+            return available, None
+        self._update(change)
+
+    def penalize(self, retry_after):
+        self._update(lambda available: (min(available, -retry_after * self.rate), None))
+
+    @property
+    def remaining(self):
+        return self._update(lambda available: (available, available))
+
+    @remaining.setter
+    def remaining(self, tokens):
+        self._update(lambda available: (min(self.capacity, float(tokens)), None))
+
+
+def _observed(capacity, rate, tokens, remaining=None, limit=None, reset_after=None):
+    """New (capacity, rate, tokens) of a bucket after the provider reported its budget."""
+    if limit:
+        capacity = float(limit)
+        rate = capacity / 60.0
+    if remaining is not None:
+        tokens = min(capacity, float(remaining))
+        if reset_after and reset_after > 0 and capacity > tokens:
+            rate = (capacity - tokens) / reset_after                        # Refill speed the provider reports
+    return capacity, rate, tokens
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT on a connection, rolled back on errors; closes the connection."""
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")                                  # Take the write lock up front
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
+
+
+class RateLimitCoordinator:
+    """
+    Process-wide registry of rate-limit buckets keyed by (provider, model, api key), so every LLM instance
+    using the same quota draws from one budget. API keys are only kept as a hash.
+    With RateLimitConfig.shared_state_path set, buckets live in that SQLite file and are shared across processes.
+    """
+    _instance = None                                                    # Singleton
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        """Implement Singleton pattern. Only one instance of this class is created."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(RateLimitCoordinator, cls).__new__(cls)
+                cls._instance.buckets = {}
+                cls._instance.lock = threading.Lock()
+        return cls._instance
+
+    @staticmethod
+    def bucket_key(provider, model, api_key=None, kind='tokens'):
+        key_hash = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else '-'
+        return (str(provider).lower(), str(model), key_hash, kind)
+
+    def get_bucket(self, provider, model, rate_per_minute, api_key=None, kind='tokens'):
+        """
+        Return the shared bucket for a quota, creating it on first use with rate_per_minute.
+        kind separates limits of one quota, e.g. 'tokens' and 'requests' per minute.
+        """
+        key = self.bucket_key(provider, model, api_key, kind)
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                path = RateLimitConfig.shared_state_path
+                if path:
+                    bucket = SqliteTokenBucket(path, "|".join(key), rate_per_minute)
+                else:
+                    bucket = TokenBucket(rate_per_minute)
+                logger.debug(f"Created {type(bucket).__name__} {key} with {rate_per_minute}/min.")
+                self.buckets[key] = bucket
+            return bucket
@@ -5,26 +5,38 @@ from RestrictedPython.PrintCollector import PrintCollector
 from RestrictedPython.Guards import safe_builtins
 from RestrictedPython.Eval import default_guarded_getitem
 from RestrictedPython import compile_restricted
-from config.config import ToolsConfig
+from utils.callable_registry import CallableRegistry
 import pandas as pd
+import ast
 
-integration_dict = ToolsConfig.integration_dict
 
+def get_referenced_names(expression):
+    """Return the global names an expression refers to, e.g. 'DuckDuckGoSearchAPIWrapper' in 'DuckDuckGoSearchAPIWrapper()'."""
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError:
+        return set()                                                    # compile_restricted reports the error
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
 
-def get_safe_execution_environment(integration_dict):
+
+def get_safe_execution_environment(names=()):
     """
-    Prepare a safe execution environment for RestrictedPython using an integration dictionary
-    populated with dynamically imported module members.
+    Prepare a safe execution environment for RestrictedPython. Only the callables referenced by
+    the expression are resolved from the CallableRegistry, which imports their modules on demand.
     
     Args:
-        integration_dict (dict): Dictionary containing public members from dynamically imported modules.
+        names (iterable): Global names referenced by the expression to evaluate.
     
     Returns:
         tuple: A tuple containing dictionaries for globals and locals for the execution environment.
     """
     safe_globals = safe_builtins.copy()
-    # Update safe_globals with the contents of integration_dict
-    safe_globals.update(integration_dict)
+    registry = CallableRegistry()
+    for name in names:
+        if name not in safe_globals:
+            obj = registry.get_callable(name)
+            if obj is not None:
+                safe_globals[name] = obj
 
     safe_locals = {
             '_print_':   PrintCollector(),
@@ -42,7 +54,6 @@ def parse_arguments(arg_str):
         raise ValueError(f"Input too long. Maximum allowed length is {max_length} characters.")
 
     args, kwargs = [], {}
-    globals_dict, locals_dict = get_safe_execution_environment(integration_dict)
 
     for pair in arg_str.split(','):
         pair = pair.strip()
@@ -56,6 +67,7 @@ def parse_arguments(arg_str):
                 logger.error(f"Invalid keyword '{key}'. Must be a valid identifier.")
                 raise ValueError(f"Invalid keyword '{key}'. Must be a valid identifier.")
             byte_code = compile_restricted(value, '<string>', 'eval')
+            globals_dict, locals_dict = get_safe_execution_environment(get_referenced_names(value))
             try:
                 kwargs[key] = eval(byte_code, globals_dict, locals_dict)
             except Exception as e:
@@ -64,6 +76,7 @@ def parse_arguments(arg_str):
         elif len(key_value) == 1:
             value = key_value[0].strip()
             byte_code = compile_restricted(value, '<string>', 'eval')
+            globals_dict, locals_dict = get_safe_execution_environment(get_referenced_names(value))
             try:
                 args.append(eval(byte_code, globals_dict, locals_dict))
             except Exception as e:
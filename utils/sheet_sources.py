@@ -0,0 +1,154 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import SheetsConfig
+from     urllib.error import URLError, HTTPError
+from     urllib.request import urlopen, Request
+from     utils.sheets_cache import SheetSnapshotCache, get_sheet_id
+from     concurrent.futures import ThreadPoolExecutor
+from     abc import ABC, abstractmethod
+import   pandas as pd
+import   io
+import   os
+
+
+class SheetsFetchError(URLError):
+    """Raised when one or more worksheets could not be downloaded. failures maps worksheet -> exception."""
+    def __init__(self, failures):
+        self.failures = failures
+        details = "; ".join(f"'{worksheet}': {error}" for worksheet, error in failures.items())
+        super().__init__(f"Failed to download {len(failures)} worksheet(s): {details}")
+
+
+class SheetsOfflineError(URLError):
+    """Raised in offline mode when a worksheet has no local snapshot."""
+
+
+class SheetSource(ABC):
+    """
+    A place the five crew worksheets (Agents, Tasks, Crew, Models, Tools) are read from.
+    Sources return the raw worksheets; column selection and sanitization are done by Sheets.
+    """
+    def __init__(self, location):
+        self.location = location
+
+    @abstractmethod
+    def read_worksheets(self, worksheets):
+        """Return a dict worksheet -> raw DataFrame for the given worksheet names."""
+
+    def __repr__(self):
+        return f"{type(self).__name__}('{self.location}')"
+
+
+class GoogleSheetSource(SheetSource):
+    """Google Sheet read through the gviz CSV endpoint, with local snapshots (see SheetSnapshotCache)."""
+    @staticmethod
+    def fetch_worksheet(url, timeout=None, cache=None, sheet_id=None, worksheet=None):
+        """
+        Download one worksheet as CSV bytes. With a cache, a fresh snapshot is returned without a request,
+        an older one is revalidated with a conditional request, and offline mode never touches the network.
+        """
+        timeout = timeout or SheetsConfig.fetch_timeout
+        if cache is None:
+            with urlopen(url, timeout=timeout) as response:
+                return response.read()
+
+        entry = cache.get(sheet_id, worksheet)
+        if cache.offline:
+            if entry is None:
+                raise SheetsOfflineError(f"No local snapshot of worksheet '{worksheet}' for offline mode.")
+            return cache.load(entry)
+        if cache.is_fresh(entry):
+            logger.info(f"Using cached snapshot of worksheet '{worksheet}'.")
+            return cache.load(entry)
+
+        request = Request(url, headers=SheetSnapshotCache.conditional_headers(entry))
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                content = response.read()
+                headers = response.headers
+        except HTTPError as e:
+            if e.code == 304 and entry is not None:
+                logger.info(f"Worksheet '{worksheet}' not modified. Using cached snapshot.")
+                try:
+                    cache.touch(sheet_id, worksheet, entry)
+                except OSError as touch_error:
+                    logger.warning(f"Failed to update the snapshot of worksheet '{worksheet}': {touch_error}")
+                return cache.load(entry)
+            raise
+        try:                                                            # A read-only or full cache dir must not fail the download
+            cache.store(sheet_id, worksheet, content, etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'))
+        except OSError as e:
+            logger.warning(f"Failed to store a snapshot of worksheet '{worksheet}': {e}")
+        return content
+
+    def fetch(self, worksheets, timeout=None, max_workers=None, cache=None):
+        """
+        Download all worksheets concurrently, so loading takes about one round trip instead of one per worksheet.
+        Worksheets are served from the local snapshot cache when SheetsConfig.cache_enabled is set.
+        Returns a dict worksheet -> CSV bytes. Raises SheetsFetchError listing every worksheet that failed.
+        """
+        base_url = self.location.split('/edit')[0]
+        sheet_id = get_sheet_id(self.location)
+        max_workers = max_workers or SheetsConfig.fetch_workers
+        if cache is None and (SheetsConfig.cache_enabled or SheetsConfig.offline):
+            cache = SheetSnapshotCache()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets") as executor:
+            futures = {
+                worksheet: executor.submit(self.fetch_worksheet, f'{base_url}/gviz/tq?tqx=out:csv&sheet={worksheet}',
+                                           timeout, cache, sheet_id, worksheet)
+                for worksheet in worksheets
+            }
+        contents, failures = {}, {}
+        for worksheet, future in futures.items():
+            try:
+                contents[worksheet] = future.result()
+            except Exception as e:                                      # Timeouts, HTTP and connection errors
+                logger.error(f"Failed to download worksheet '{worksheet}': {e}")
+                failures[worksheet] = e
+        if failures:
+            raise SheetsFetchError(failures)
+        return contents
+
+    def read_worksheets(self, worksheets):
+        contents = self.fetch(worksheets)
+        return {worksheet: pd.read_csv(io.BytesIO(contents[worksheet])) for worksheet in worksheets}
+
+
+class CsvDirectorySource(SheetSource):
+    """Directory with one '<Worksheet>.csv' file per worksheet, e.g. Agents.csv, Tasks.csv, ..."""
+    def read_worksheets(self, worksheets):
+        return {worksheet: pd.read_csv(os.path.join(self.location, f"{worksheet}.csv")) for worksheet in worksheets}
+
+
+class ParquetBundleSource(SheetSource):
+    """Directory with one '<Worksheet>.parquet' file per worksheet."""
+    def read_worksheets(self, worksheets):
+        try:
+            return {worksheet: pd.read_parquet(os.path.join(self.location, f"{worksheet}.parquet")) for worksheet in worksheets}
+        except ImportError as e:
+            raise ImportError(f"Reading Parquet bundles needs pyarrow or fastparquet (pip install pyarrow): {e}")
+
+
+class XlsxWorkbookSource(SheetSource):
+    """Excel workbook with one sheet per worksheet, e.g. a Google Sheet downloaded as .xlsx."""
+    def read_worksheets(self, worksheets):
+        try:
+            return pd.read_excel(self.location, sheet_name=list(worksheets))
+        except ImportError as e:
+            raise ImportError(f"Reading XLSX workbooks needs openpyxl (pip install openpyxl): {e}")
+
+
+def get_sheet_source(location):
+    """Pick the source for a Google Sheet URL, an .xlsx workbook, or a directory of CSV or Parquet files."""
+    if isinstance(location, SheetSource):
+        return location
+    if location.startswith(('http://', 'https://')):
+        return GoogleSheetSource(location)
+    path = os.path.expanduser(location)
+    if os.path.isfile(path) and path.lower().endswith(('.xlsx', '.xlsm')):
+        return XlsxWorkbookSource(path)
+    if os.path.isdir(path):
+        if any(name.lower().endswith('.parquet') for name in os.listdir(path)):
+            return ParquetBundleSource(path)
+        return CsvDirectorySource(path)
+    raise ValueError(f"'{location}' is not a Google Sheet URL, an .xlsx workbook or a directory of CSV/Parquet worksheets.")
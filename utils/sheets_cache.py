@@ -0,0 +1,90 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import SheetsConfig
+import   hashlib
+import   json
+import   os
+import   re
+import   time
+
+
+def get_sheet_id(sheet_url):
+    """Extract the spreadsheet id from a Google Sheet URL. Falls back to a hash of the URL."""
+    match = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', sheet_url)
+    if match:
+        return match.group(1)
+    return hashlib.sha256(sheet_url.encode()).hexdigest()[:32]
+
+
+class SheetSnapshotCache:
+    """
+    Content-addressed local cache of worksheet CSVs.
+
+    Layout under cache_dir:
+        blobs/<sha256>.csv                    - worksheet contents, stored once per distinct content
+        index/<sheet_id>/<worksheet>.json     - sha256, ETag, Last-Modified and time of the last successful check
+
+    A snapshot younger than ttl seconds is used without contacting the server. Older snapshots are
+    revalidated with If-None-Match / If-Modified-Since. In offline mode only snapshots are used.
+    """
+    def __init__(self, cache_dir=None, ttl=None, offline=None):
+        self.cache_dir = cache_dir or SheetsConfig.cache_dir
+        self.ttl = SheetsConfig.cache_ttl if ttl is None else ttl
+        self.offline = SheetsConfig.offline if offline is None else offline
+
+    def _entry_path(self, sheet_id, worksheet):
+        return os.path.join(self.cache_dir, "index", sheet_id, f"{worksheet}.json")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, "blobs", f"{digest}.csv")
+
+    def get(self, sheet_id, worksheet):
+        """Return the index entry of a worksheet snapshot, or None if there is no usable snapshot."""
+        try:
+            with open(self._entry_path(sheet_id, worksheet), 'r') as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._blob_path(entry.get('sha256', ''))):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry.get('checked_at', 0) < self.ttl
+
+    def load(self, entry):
+        with open(self._blob_path(entry['sha256']), 'rb') as blob_file:
+            return blob_file.read()
+
+    def store(self, sheet_id, worksheet, content, etag=None, last_modified=None):
+        """Store a downloaded worksheet and point its index entry at the content."""
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            self._write_atomic(blob_path, content)
+        entry = {'sha256': digest, 'etag': etag, 'last_modified': last_modified, 'checked_at': time.time()}
+        self._write_atomic(self._entry_path(sheet_id, worksheet), json.dumps(entry).encode())
+        return entry
+
+    def touch(self, sheet_id, worksheet, entry):
+        """Mark a snapshot as revalidated (the server answered 304 Not Modified)."""
+        entry = dict(entry, checked_at=time.time())
+        self._write_atomic(self._entry_path(sheet_id, worksheet), json.dumps(entry).encode())
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    @staticmethod
+    def _write_atomic(path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{time.time_ns()}.tmp"
+        with open(tmp_path, 'wb') as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_path, path)
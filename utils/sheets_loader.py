@@ -1,83 +1,60 @@
 import   logging
 logger = logging.getLogger(__name__)
-from     config.config import AppConfig 
+from     config.config import AppConfig
 from     urllib.error import URLError
-from     textwrap import dedent
+from     utils.sheet_sources import get_sheet_source
+from     utils.sheets_schema import SCHEMAS, sanitize
 from     utils.helpers import get_sheet_url_from_user
-import   pandas as pd
+from     utils.instrumentation import tracer
 import   sys
 
 template_sheet_url = AppConfig.template_sheet_url
+
+# Define the worksheets and their respective columns to be read. Types, defaults and clean up are in utils.sheets_schema
+WORKSHEETS = {worksheet: [col.name for col in schema.columns] for worksheet, schema in SCHEMAS.items()}
+
+
 class Sheets:
     @staticmethod
-    def read_google_sheet(sheet_url):
-        # Extract the base URL from the provided Google Sheet URL
-        base_url = sheet_url.split('/edit')[0]
-        dataframes = []
-        # Define the worksheets and their respective columns to be read
-        worksheets = {
-            'Agents': ['Agent Role', 'Goal', 'Backstory', 'Tools', 'Allow delegation', 'Verbose', 'Memory', 'Max_iter','Model Name', 'Temperature', 'Function Calling Model'],
-            'Tasks' : ['Task Name', 'Agent', 'Instructions', 'Expected Output'],
-            'Crew'  : ['Team Name',	'Assignment','Verbose', 'Process', 'Memory', 'Embedding model', 'Manager LLM', 't', 'num_ctx'],
-            'Models': ['Model', 'Context size (local only)', 'Provider', 'base_url','Deployment'],
-            'Tools' : ['Tool', 'On', 'Class', 'Args',  'Model', 'Embedding Model']
-        }
-        
-        for worksheet, columns in worksheets.items():
-            url = f'{base_url}/gviz/tq?tqx=out:csv&sheet={worksheet}'
-            # Read the worksheet into a DataFrame, selecting only the specified columns
-            try:
-                data = pd.read_csv(url, usecols=columns)
-                if worksheet == 'Agents': # sanitize the data
-                    data.dropna(subset=['Agent Role'], inplace=True)
-
-                    for col in ['Agent Role', 'Goal','Backstory', 'Tools', 'Model Name', 'Function Calling Model']:
-                        data[col] = data[col].astype(str).apply(dedent).replace('None', None)
+    def sanitize_worksheet(worksheet, data):
+        """Select, type check and clean up one worksheet DataFrame read from the sheet in a single pass."""
+        return sanitize(worksheet, data)
 
-                    for col in ['Tools']:
-                        data[col] = data[col].replace('\n','')
-                    for col in ['Allow delegation', 'Verbose', 'Memory']:
-                        data[col] = data[col].astype(bool)
-                    
-                    data['Temperature'] = data['Temperature'].astype(float)
-                    data['Max_iter'] = data['Max_iter'].astype(int)
+    @staticmethod
+    def read_sheet(location):
+        """
+        Read and sanitize the five worksheets from a Google Sheet URL or a local bundle
+        (directory of CSV or Parquet files, or an .xlsx workbook). See utils.sheet_sources.
+        """
+        dataframes = []
+        try:
+            with tracer.span("sheet fetch", kind='setup', location=location):
+                raw_worksheets = get_sheet_source(location).read_worksheets(list(WORKSHEETS))
+        except Exception as e:
+            return e
 
-                if worksheet == 'Models':
-                    data['Context size (local only)'] = data['Context size (local only)'].replace(0, None)
-                    data['base_url'] = data['base_url'].replace("None", None)
-                    data['Deployment'] = data['Deployment'].replace("None", None)
-                if worksheet == 'Tasks':
-                    #check if all columns are present are string. If not, print error and exit
-                    for col in columns:
-                        #convert all columns to string
-                        data[col] = data[col].astype(str)
-                        if data[col].dtype != 'object':
-                            raise ValueError(f"Column '{col}' is not of type 'Plain Text'.")                  
-                if worksheet == "Crew":
-                    for col in ['Team Name', 'Assignment', 'Process', 'Embedding model', 'Manager LLM']:                    
-                        data[col] = data[col].astype(str).apply(dedent).replace('None', None).replace('nan', None)
-                    for col in ['Verbose', 'Memory']:
-                        data[col] = data[col].astype(bool)
-                    data['t'] = data['t'].astype(float)
-                    data['num_ctx'] = data['num_ctx'].astype(int).replace(0, None)
-                if worksheet == 'Tools':
-                    data.replace('None', None, inplace=True)
+        for worksheet in WORKSHEETS:
+            # Select the specified columns and sanitize them
+            try:
+                data = Sheets.sanitize_worksheet(worksheet, raw_worksheets[worksheet])
             except Exception as e:
                 return e
-    
-            data = data.where(pd.notnull(data), None) # Replace NaN values with None
 
             # Append the DataFrame to the list of dataframes
             dataframes.append(data)
 
         return dataframes
+
+    @staticmethod
+    def read_google_sheet(sheet_url):
+        return Sheets.read_sheet(sheet_url)
     
     @staticmethod
     def parse_table(url=template_sheet_url):
         num_att = 0
         while num_att < 10:
             try:
-                dataframes = Sheets.read_google_sheet(url)
+                dataframes = Sheets.read_sheet(url)
                 if isinstance(dataframes, Exception):
                     raise dataframes
                 break
@@ -86,7 +63,7 @@ class Sheets:
                 print(f"Oops! Something went bonkers with the sheet. {e}")
                 url = get_sheet_url_from_user()
                 num_att += 1
-            except URLError as e:
+            except (URLError, OSError) as e:                           # OSError: local sheet bundle can't be read
                 logger.error(f"URLError occurred: {e}")
                 print(f"Trying to open '{url}' and I'm all thumbs (which is sad because I don't have any)! Can you check that URL for me? {e}")
                 url = get_sheet_url_from_user()
@@ -0,0 +1,193 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     collections import namedtuple
+from     textwrap import dedent
+import   pandas as pd
+
+# Column of a worksheet.
+#   dtype       - 'text', 'bool', 'float' or 'int'
+#   default     - value used for empty cells, None keeps them empty
+#   normalizers - extra clean up steps, see NORMALIZERS
+#   required    - if False the column may be missing from the sheet and is filled with the default
+Column    = namedtuple('Column', ['name', 'dtype', 'default', 'normalizers', 'required'], defaults=[None, (), True])
+# Worksheet schema. Rows with an empty key column are dropped.
+Worksheet = namedtuple('Worksheet', ['columns', 'key'], defaults=[None])
+
+SCHEMAS = {
+    'Agents': Worksheet(key='Agent Role', columns=[
+        Column('Agent Role',             'text',  None,                                  ('dedent',)),
+        Column('Goal',                   'text',  "To assist the human in their tasks",  ('dedent',)),
+        Column('Backstory',              'text',  "...",                                 ('dedent',)),
+        Column('Tools',                  'text',  None,                                  ('dedent', 'strip')),
+        Column('Allow delegation',       'bool',  False),
+        Column('Verbose',                'bool',  True),
+        Column('Memory',                 'bool',  True),
+        Column('Max_iter',               'int',   15),
+        Column('Model Name',             'text',  'gpt-4-turbo-preview',                 ('dedent', 'strip')),
+        Column('Temperature',            'float', 0.8),
+        Column('Function Calling Model', 'text',  None,                                  ('dedent', 'strip')),
+    ]),
+    'Tasks': Worksheet(columns=[
+        Column('Task Name',              'text',  ''),
+        Column('Agent',                  'text',  ''),
+        Column('Instructions',           'text',  ''),
+        Column('Expected Output',        'text',  ''),
+        Column('Depends on',             'text',  None,   ('dedent', 'strip'),    False),
+    ]),
+    'Crew': Worksheet(columns=[
+        Column('Team Name',              'text',  None,                                  ('dedent',)),
+        Column('Assignment',             'text',  None,                                  ('dedent',)),
+        Column('Verbose',                'bool',  True),
+        Column('Process',                'text',  None,                                  ('dedent',)),
+        Column('Memory',                 'bool',  False),
+        Column('Embedding model',        'text',  None,                                  ('dedent',)),
+        Column('Manager LLM',            'text',  None,                                  ('dedent',)),
+        Column('t',                      'float', None),
+        Column('num_ctx',                'int',   None,                                  ('zero_to_none',)),
+    ]),
+    'Models': Worksheet(columns=[
+        Column('Model',                  'text'),
+        Column('Context size (local only)', 'int', None,                                 ('zero_to_none',)),
+        Column('Provider',               'text'),
+        Column('base_url',               'text'),
+        Column('Deployment',             'text'),
+        Column('RPM',                    'int',   None,   ('zero_to_none',),      False),
+        Column('TPM',                    'int',   None,   ('zero_to_none',),      False),
+        Column('Max in-flight',          'int',   None,   ('zero_to_none',),      False),
+        Column('Max retries',            'int',   None,   (),                     False),
+    ]),
+    'Tools': Worksheet(columns=[
+        Column('Tool',                   'text'),
+        Column('On',                     'bool',  False),
+        Column('Class',                  'text'),
+        Column('Args',                   'text'),
+        Column('Model',                  'text'),
+        Column('Embedding Model',        'text'),
+    ]),
+}
+
+TRUE_VALUES  = ['true', 't', 'yes', 'y', '1', '1.0', 'on']
+FALSE_VALUES = ['false', 'f', 'no', 'n', '0', '0.0', 'off']
+
+
+def _dedent(text):
+    """Dedent only the cells that have indented lines; dedent() leaves all other cells unchanged."""
+    indented = text.str.contains(r'(?m)^[ \t]', regex=True, na=False)
+    if indented.any():
+        text = text.copy()
+        text[indented] = text[indented].map(dedent)
+    return text
+
+
+def _strip(text):
+    stripped = text.str.strip()
+    return stripped.where(stripped.notna() & (stripped != ''), None)
+
+
+def _zero_to_none(values):
+    return values.where(values != 0, None)
+
+
+NORMALIZERS = {
+    'dedent':       _dedent,
+    'strip':        _strip,
+    'zero_to_none': _zero_to_none,
+}
+
+
+class SchemaErrors(ValueError):
+    """All type errors found in a worksheet, each with its sheet row and column."""
+    def __init__(self, worksheet, errors):
+        self.worksheet = worksheet
+        self.errors = errors
+        shown = "\n".join(f"  - {error}" for error in errors[:20])
+        more = f"\n  ... and {len(errors) - 20} more" if len(errors) > 20 else ""
+        super().__init__(f"Worksheet '{worksheet}' has {len(errors)} invalid value(s):\n{shown}{more}")
+
+
+def _sheet_row(index_label):
+    """Row number as shown in the sheet: the header is row 1, so the first data row is row 2."""
+    return index_label + 2 if pd.api.types.is_integer(index_label) else index_label
+
+
+def _to_text(values):
+    values = values.astype(object)
+    text = values.astype(str).where(values.notna(), None)
+    return text.where(text != 'None', None)                             # The sheet writes 'None' for empty dropdowns
+
+
+def _to_bool(values, column, errors):
+    if values.dtype == bool:
+        return values
+    lowered = values.astype(str).str.strip().str.lower().where(values.notna(), None)
+    is_true, is_false = lowered.isin(TRUE_VALUES), lowered.isin(FALSE_VALUES)
+    for label in values.index[lowered.notna() & ~is_true & ~is_false]:
+        errors.append(f"row {_sheet_row(label)}, column '{column}': expected TRUE or FALSE, got '{values[label]}'")
+    return is_true.where(lowered.notna(), None)
+
+
+def _to_number(values, column, dtype, errors):
+    if dtype == 'int' and pd.api.types.is_integer_dtype(values):
+        return values
+    numbers = pd.to_numeric(values, errors='coerce')
+    invalid = numbers.isna() & values.notna()
+    if dtype == 'int':
+        invalid |= numbers.notna() & (numbers % 1 != 0)
+    for label in values.index[invalid]:
+        expected = 'a whole number' if dtype == 'int' else 'a number'
+        errors.append(f"row {_sheet_row(label)}, column '{column}': expected {expected}, got '{values[label]}'")
+    return numbers.where(~invalid)
+
+
+def _finalize(values, default, dtype):
+    """Fill defaults and pick the narrowest dtype: plain bool/int/float without empty cells, object with None otherwise."""
+    if default is not None:
+        values = values.where(values.notna(), default)
+    if dtype == 'int':
+        values = values.astype('Int64')                                 # Whole numbers stay ints next to empty cells
+    if values.notna().all():
+        if dtype == 'bool':
+            return values.astype(bool)
+        if dtype == 'int':
+            return values.astype('int64')
+        if dtype == 'float':
+            return values.astype('float64')
+        return values
+    return values.astype(object).where(values.notna(), None)
+
+
+def sanitize(worksheet, data):
+    """
+    Select, convert and normalize all columns of a raw worksheet in one pass.
+    Raises ValueError for missing columns and SchemaErrors (a ValueError) listing every invalid cell.
+    Returns a new DataFrame; the raw DataFrame is not modified.
+    """
+    schema = SCHEMAS[worksheet]
+    missing = [col.name for col in schema.columns if col.required and col.name not in data.columns]
+    if missing:
+        raise ValueError(f"Worksheet '{worksheet}' is missing columns: {', '.join(missing)}")
+
+    if schema.key is not None:
+        data = data[data[schema.key].notna()]
+
+    errors, columns = [], {}
+    for col in schema.columns:
+        if col.name not in data.columns:
+            values = pd.Series(None, index=data.index, dtype=object)
+        else:
+            values = data[col.name]
+
+        if col.dtype == 'text':
+            values = _to_text(values)
+        elif col.dtype == 'bool':
+            values = _to_bool(values, col.name, errors)
+        else:
+            values = _to_number(values, col.name, col.dtype, errors)
+
+        for normalizer in col.normalizers:
+            values = NORMALIZERS[normalizer](values)
+        columns[col.name] = _finalize(values, col.default, col.dtype)
+
+    if errors:
+        raise SchemaErrors(worksheet, errors)
+    return pd.DataFrame(columns, index=data.index)
@@ -0,0 +1,117 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import TaskGraphConfig
+from     concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import   contextvars
+import   pandas as pd
+import   threading
+
+
+def parse_dependencies(tasks_df):
+    """
+    Upstream task rows of every task row, from the optional 'Depends on' column (comma separated Task Names).
+    Returns {row: [upstream rows]}, all empty if the column is missing or blank.
+    Raises ValueError for unknown or ambiguous task names and for dependency cycles.
+    """
+    rows_by_name = {}
+    for row, name in tasks_df['Task Name'].items():
+        if name:
+            rows_by_name.setdefault(str(name).strip(), []).append(row)
+
+    upstream = {row: [] for row in tasks_df.index}
+    if 'Depends on' not in tasks_df.columns:
+        return upstream
+    for row, depends_on in tasks_df['Depends on'].items():
+        if depends_on is None or pd.isna(depends_on):
+            continue
+        for name in [name.strip() for name in str(depends_on).split(',') if name.strip()]:
+            matches = rows_by_name.get(name, [])
+            if len(matches) != 1:
+                problem = "unknown" if not matches else "ambiguous (several tasks have this name)"
+                raise ValueError(f"Task '{tasks_df['Task Name'][row]}' depends on '{name}', which is {problem}.")
+            if matches[0] not in upstream[row]:
+                upstream[row].append(matches[0])
+
+    _check_acyclic(upstream, tasks_df['Task Name'])
+    return upstream
+
+
+def _check_acyclic(upstream, names):
+    state = {}                                                          # row -> 'visiting' | 'done'
+
+    def visit(row, path):
+        if state.get(row) == 'done':
+            return
+        if state.get(row) == 'visiting':
+            cycle = path[path.index(row):] + [row]
+            raise ValueError(f"Task dependencies form a cycle: {' -> '.join(str(names[r]) for r in cycle)}")
+        state[row] = 'visiting'
+        for parent in upstream[row]:
+            visit(parent, path + [row])
+        state[row] = 'done'
+
+    for row in upstream:
+        visit(row, [])
+
+
+def _prepare_crew(crew, tasks):
+    """The agent set up crew.kickoff does before running tasks (crewai 0.28)."""
+    from crewai.utilities import I18N
+    from crewai.tools.agent_tools import AgentTools
+
+    i18n = I18N(language=crew.language, language_file=crew.language_file)
+    for agent in crew.agents:
+        agent.i18n = i18n
+        agent.crew = crew
+        if not agent.function_calling_llm:
+            agent.function_calling_llm = crew.function_calling_llm
+        if not agent.step_callback:
+            agent.step_callback = crew.step_callback
+        agent.create_agent_executor()
+
+    for task in tasks:
+        if task.agent is not None and task.agent.allow_delegation:
+            others = [agent for agent in crew.agents if agent != task.agent]
+            if others:
+                task.tools += AgentTools(agents=others).tools()
+
+
+def run_task_graph(crew, tasks, upstream, done=(), max_workers=None):
+    """
+    Run the tasks of a sequential crew as a DAG: every task starts as soon as its upstream tasks finished,
+    independent tasks run concurrently and receive their upstream outputs as context.
+    An agent works on one task at a time. tasks is {row: Task} in sheet order, upstream from parse_dependencies,
+    done the rows whose output is already known (restored checkpoints).
+    Returns the output of the last task.
+    """
+    _prepare_crew(crew, [task for row, task in tasks.items() if row not in done])
+    agent_locks = {id(agent): threading.Lock() for agent in crew.agents}
+    finished = set(done)
+    remaining = [row for row in tasks if row not in finished]
+    max_workers = max(1, min(max_workers or TaskGraphConfig.workers, len(remaining) or 1))
+
+    def execute(row):
+        task = tasks[row]
+        with agent_locks.get(id(task.agent), threading.Lock()):
+            logger.info(f"Starting task row {row}: {task.description[:80]}")
+            return task.execute()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task") as executor:
+        running = {}
+        while remaining or running:
+            for row in [row for row in remaining if all(parent in finished for parent in upstream[row])]:
+                remaining.remove(row)
+                running[executor.submit(contextvars.copy_context().run, execute, row)] = row   # Keep the caller's span
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                row = running.pop(future)
+                if future.exception() is not None:
+                    for pending in running:
+                        pending.cancel()
+                    raise future.exception()
+                finished.add(row)
+
+    metrics = [agent._token_process.get_summary() for agent in crew.agents]
+    crew.usage_metrics = {key: sum(m[key] for m in metrics if m is not None) for key in metrics[0]} if metrics else {}
+    last = tasks[list(tasks)[-1]]
+    return last.output.exported_output
@@ -0,0 +1,89 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import TokenizerConfig
+from     collections import OrderedDict
+import   hashlib
+import   os
+import   shutil
+import   threading
+
+# Encoding name -> tiktoken Encoding. Loaded on first use and shared by every throttled LLM in the process.
+_encoders = {}
+_encoder_locks = {}
+_lock = threading.Lock()
+
+_token_counts = OrderedDict()                                           # (encoding, content digest) -> token count
+_token_counts_lock = threading.Lock()
+
+BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/{name}.tiktoken"
+
+
+def encoding_name_for(model_name=None):
+    """tiktoken encoding name for a model. Models tiktoken doesn't know (e.g. Groq's) use TokenizerConfig.default_encoding."""
+    if model_name:
+        try:
+            from tiktoken.model import encoding_name_for_model
+            return encoding_name_for_model(model_name)
+        except KeyError:
+            pass
+    return TokenizerConfig.default_encoding
+
+
+def prewarm(encoding_name, bpe_path):
+    """
+    Put a local BPE file into tiktoken's cache under the key tiktoken looks for (sha1 of the download URL),
+    so the encoding loads without network access. Returns the cache path.
+    """
+    cache_dir = os.environ.setdefault("TIKTOKEN_CACHE_DIR", TokenizerConfig.cache_dir)
+    url = BPE_URL.format(name=encoding_name)
+    cache_path = os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest())
+    if not os.path.exists(cache_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        shutil.copyfile(os.path.expanduser(bpe_path), tmp_path)
+        os.replace(tmp_path, cache_path)
+        logger.info(f"Pre-warmed tiktoken encoding '{encoding_name}' from {bpe_path}.")
+    return cache_path
+
+
+def get_encoder(model_name=None, encoding_name=None):
+    """Return the shared tiktoken encoder for a model or encoding name, loading it on first use."""
+    encoding_name = encoding_name or encoding_name_for(model_name)
+    encoder = _encoders.get(encoding_name)
+    if encoder is not None:
+        return encoder
+    with _lock:
+        encoder_lock = _encoder_locks.setdefault(encoding_name, threading.Lock())
+    with encoder_lock:                                                  # Load (and maybe download) each encoding once
+        encoder = _encoders.get(encoding_name)
+        if encoder is None:
+            import tiktoken
+            os.environ.setdefault("TIKTOKEN_CACHE_DIR", TokenizerConfig.cache_dir)
+            bpe_path = TokenizerConfig.bpe_files.get(encoding_name)
+            if bpe_path:
+                prewarm(encoding_name, bpe_path)
+            encoder = tiktoken.get_encoding(encoding_name)
+            _encoders[encoding_name] = encoder
+            logger.debug(f"Loaded tiktoken encoding '{encoding_name}'.")
+    return encoder
+
+
+def count_tokens(enc, content):
+    """
+    Token count of one message content, cached by a hash of the content. Agent conversations grow by
+    appending messages, so on every step only the new messages are encoded.
+    """
+    if not isinstance(content, str):
+        content = str(content)                                          # e.g. multi-part message content
+    key = (enc.name, hashlib.blake2b(content.encode(), digest_size=16).digest())
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+    count = len(enc.encode(content))
+    with _token_counts_lock:
+        _token_counts[key] = count
+        while len(_token_counts) > TokenizerConfig.token_count_cache_size:
+            _token_counts.popitem(last=False)
+    return count
@@ -2,21 +2,23 @@ import os
 import logging
 import pandas as pd
 from utils.helpers import load_env
+from utils.model_registry import ModelRegistry
 logger = logging.getLogger(__name__)
 #load_env("../../ENV/.env", ["OPENAI_API_KEY",])
 
 #Class to manage the configuration of the LLM to Tools
 class ConfigurationManager:
-    def __init__(self, models_df):
-        self.df = models_df
+    def __init__(self, models):
+        # Accepts the Models sheet DataFrame or an already built ModelRegistry
+        self.model_registry = models if isinstance(models, ModelRegistry) else ModelRegistry(models)
 
     def select(self, target_column, where_column, equals):
-        try:
-            result = self.df.loc[self.df[where_column] == equals, target_column].iloc[0]
-            return result if not pd.isna(result) else None
-        except IndexError:
+        """Value of a Models sheet column for a model. Only lookups by 'Model' are supported."""
+        record = self.model_registry.get(equals) if where_column == 'Model' else None
+        if record is None:
             logger.info(f"No match found for {equals} in {where_column}")
             return None
+        return getattr(record, ModelRegistry.columns[target_column])
 
     def get_model_details(self, model=None, embedding_model=None):
         # Default settings for OpenAI if specific model details are not provided
@@ -62,6 +64,7 @@ class ConfigurationManager:
         return config
 
 def get_config(model=None, embedding_model=None, models_df=None):
+    """Build the llm/embedder config of a tool. models_df may be the Models sheet or a ModelRegistry."""
     if not model and not embedding_model:
         return None
     
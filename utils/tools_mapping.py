@@ -7,6 +7,9 @@ from utils.callable_registry    import CallableRegistry
 
 from utils.safe_argment_parser  import parse_arguments
 from utils.tools_llm_config     import get_config
+from utils.model_registry        import ModelRegistry
+from utils.instrumentation       import tracer, instrument_tool
+from config.config              import ToolsConfig
 
 
 import os
@@ -15,11 +18,19 @@ import re
 
 
 class ToolsMapping:
+    """
+    Run-scoped tool cache. Every enabled tool in the Tools sheet is built once when the mapping is created;
+    agents then get the shared instances via get_agent_tools(). Tools listed in ToolsConfig.tool_instancing
+    can instead be cloned or rebuilt for each agent.
+    """
     def __init__(self, tools_df, models_df):
         self.tool_registry = CallableRegistry()     ## Registry of all callables from all modules defined in tools_config.py... 
                                                     ## CallableRegistry itaretes through all allowed tool modules and registers all callables... 
                                                     ##...so that we can add tools by configuation in the tools_df
         self.tools = {}
+        self.recipes = {}                           # tool_name -> (callable, args, kwargs, base_name), used to rebuild per agent
+        if not isinstance(models_df, ModelRegistry):
+            models_df = ModelRegistry(models_df)    # Index the Models sheet once for all tools
         self.load_tools(tools_df, models_df)
     
     def load_tools(self, tools_df, models_df):
@@ -73,18 +84,49 @@ class ToolsMapping:
                     #TODO see if more processing is neede here. There is potentia; to change up env variables for each tool and stay in the
                         #also print the config
                     #print(f"ToolsMapping about to add kwargs callable '{tool_name}': {kwargs['config']}")
-                    self.tools[tool_name] = class_or_func(*args, **kwargs)
+                    self.recipes[tool_name] = (class_or_func, args, kwargs, base_name)
+                    self.tools[tool_name] = self._build_tool(tool_name)
             else:
                 logger.error(f"Callable for '{base_name}' is not a function or class constructor.")
-        
-        for tool_name, tool in self.tools.items():
-            if isinstance(tool, list) and tool:
-                self.tools[tool_name] = tool[0]
+
+    def _build_tool(self, tool_name):
+        """ Instantiate a tool from its recipe. Callables returning a list of tools (e.g. load_tools) yield the first one. """
+        class_or_func, args, kwargs, _ = self.recipes[tool_name]
+        with tracer.span(f"build tool {tool_name}", kind='setup', tool=tool_name):
+            tool = class_or_func(*args, **kwargs)
+        if isinstance(tool, list) and tool:
+            tool = tool[0]
+        return instrument_tool(tool)                # Spans for each call of the tool if instrumentation is on
+
+    def _instancing(self, tool_name):
+        """ Look up how a tool is handed to agents: 'shared', 'clone' or 'new'. """
+        instancing = ToolsConfig.tool_instancing
+        base_name = self.recipes[tool_name][3]
+        return instancing.get(tool_name, instancing.get(base_name, 'shared'))
 
     def get_tools(self):
         """ Retrieve the dictionary of all tools. """
         return self.tools
 
+    def get_agent_tools(self, tool_names):
+        """ Retrieve tools for one agent, in the order given. Unknown or disabled tools are skipped. """
+        agent_tools = []
+        for tool_name in tool_names:
+            if tool_name not in self.tools:
+                continue
+            instancing = self._instancing(tool_name)
+            tool = self.tools[tool_name]
+            if instancing == 'new':
+                tool = self._build_tool(tool_name)
+            elif instancing == 'clone':
+                if hasattr(tool, 'copy'):
+                    tool = tool.copy()                  # pydantic shallow copy: own field values, shared clients
+                else:
+                    logger.warning(f"Tool '{tool_name}' can't be cloned. Building a new instance instead.")
+                    tool = self._build_tool(tool_name)
+            agent_tools.append(tool)
+        return agent_tools
+
 # TODO
 #   def tool_wrapper(tool_func, max_output_size):
 #     def wrapped_function(*args, **kwargs):
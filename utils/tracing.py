@@ -0,0 +1,175 @@
+import   logging
+logger = logging.getLogger(__name__)
+from     config.config import AppConfig, TracingConfig, SentryConfig
+from     utils.instrumentation import tracer
+import   atexit
+import   json
+import   os
+import   queue
+import   threading
+import   urllib.request
+
+
+class FileSpanExporter:
+    """Appends every finished span as one JSON line (see Span.to_dict) to a file."""
+    def __init__(self, path=None):
+        self.path = path or TracingConfig.file_path
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def shutdown(self):
+        with self.lock:
+            self.file.close()
+
+
+# Span kinds of utils.instrumentation -> OTLP SpanKind (1 internal, 3 client)
+_OTLP_KINDS = {'llm': 3, 'tool': 3}
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def otlp_span(span):
+    """A span in the OTLP/JSON encoding. Token counts use the gen_ai semantic conventions."""
+    attributes = dict(span.attributes, **{'crewai_sheets.kind': span.kind, 'thread.name': span.thread})
+    if span.prompt_tokens or span.completion_tokens:
+        attributes['gen_ai.usage.input_tokens'] = span.prompt_tokens
+        attributes['gen_ai.usage.output_tokens'] = span.completion_tokens
+    record = {
+        'traceId':           span.trace_id,
+        'spanId':            span.span_id,
+        'name':              span.name,
+        'kind':              _OTLP_KINDS.get(span.kind, 1),
+        'startTimeUnixNano': str(int(span.start * 1e9)),
+        'endTimeUnixNano':   str(int(span.end * 1e9)),
+        'attributes':        _otlp_attributes(attributes),
+        'status':            {'code': 2, 'message': span.error} if span.error else {'code': 1},
+    }
+    if span.parent is not None:
+        record['parentSpanId'] = span.parent.span_id
+    return record
+
+
+class OTLPHttpExporter:
+    """
+    Sends spans to an OpenTelemetry collector over OTLP/HTTP with JSON bodies, without the OpenTelemetry SDK.
+    Spans are queued and posted in batches from a background thread, so recording a span never waits on
+    the network. When the queue is full new spans are dropped.
+    """
+    def __init__(self, endpoint=None, headers=None, service_name=None):
+        self.endpoint = endpoint or TracingConfig.otlp_endpoint
+        self.headers = dict(headers or TracingConfig.otlp_headers, **{'Content-Type': 'application/json'})
+        self.resource = {'attributes': _otlp_attributes({'service.name':    service_name or TracingConfig.service_name,
+                                                         'service.version': AppConfig.version})}
+        self.queue = queue.Queue(maxsize=TracingConfig.otlp_queue_size)
+        self.dropped = 0
+        self.stopped = threading.Event()
+        self.worker = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self.worker.start()
+
+    def export(self, span):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _batch(self, timeout):
+        spans = []
+        try:
+            spans.append(self.queue.get(timeout=timeout))
+            while len(spans) < TracingConfig.otlp_batch_size:
+                spans.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return spans
+
+    def _run(self):
+        while not self.stopped.is_set() or not self.queue.empty():
+            spans = self._batch(0.1 if self.stopped.is_set() else TracingConfig.otlp_flush_interval)
+            if spans:
+                self._post(spans)
+
+    def _post(self, spans):
+        body = {'resourceSpans': [{
+            'resource':   self.resource,
+            'scopeSpans': [{'scope': {'name': AppConfig.name, 'version': AppConfig.version},
+                            'spans': [otlp_span(span) for span in spans]}],
+        }]}
+        request = urllib.request.Request(self.endpoint, data=json.dumps(body).encode(), headers=self.headers,
+                                         method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=TracingConfig.otlp_timeout) as response:
+                response.read()
+        except Exception as e:
+            logger.error(f"Failed to export {len(spans)} spans to {self.endpoint}: {e}")
+
+    def shutdown(self, timeout=None):
+        """Send the spans still queued, waiting at most timeout seconds."""
+        self.stopped.set()
+        self.worker.join(TracingConfig.otlp_timeout if timeout is None else timeout)
+        if self.dropped:
+            logger.warning(f"{self.dropped} spans were dropped because the OTLP export queue was full.")
+
+
+EXPORTERS = {
+    'file': FileSpanExporter,
+    'otlp': OTLPHttpExporter,
+}
+
+
+def setup_tracing(backends=None, sample_rate=None):
+    """
+    Start the span exporters named in backends (default TracingConfig.backends) and flush them at exit.
+    Returns the exporters started.
+    """
+    if sample_rate is not None:
+        TracingConfig.sample_rate = sample_rate
+    exporters = []
+    for name in TracingConfig.backends if backends is None else backends:
+        name = name.strip().lower()
+        if not name:
+            continue
+        exporter_class = EXPORTERS.get(name)
+        if exporter_class is None:
+            logger.error(f"Unknown tracing backend '{name}'. Choose from: {', '.join(EXPORTERS)}.")
+            continue
+        try:
+            exporters.append(exporter_class())
+        except Exception as e:
+            logger.error(f"Failed to start the '{name}' tracing backend: {e}")
+    tracer.exporters.extend(exporters)
+    for exporter in exporters:
+        atexit.register(exporter.shutdown)
+    return exporters
+
+
+def setup_sentry(release=None):
+    """Error reports, and traces/profiles at the configured sample rates, to Sentry if SentryConfig.enabled."""
+    if not SentryConfig.enabled or not SentryConfig.dsn:
+        return False
+    import sentry_sdk
+    sentry_sdk.init(
+        dsn=SentryConfig.dsn,
+        traces_sample_rate=SentryConfig.traces_sample_rate,
+        profiles_sample_rate=SentryConfig.profiles_sample_rate,
+        release=release,
+    )
+    return True